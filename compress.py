@@ -7,7 +7,7 @@
 
 import sys, os.path, optparse
 
-from msodumper import vbahelper
+from msodumper import vbahelper, ole
 
 def main():
 
@@ -15,11 +15,13 @@ def main():
     if len ( sys.argv ) > 1:
         offset = int(sys.argv[1])
 
-    chars = sys.stdin.read()
+    # large input is spilled into a temporary file instead of being kept in
+    # memory.
+    chars = ole.readFile('-')
 
     decompressed = vbahelper.UnCompressedVBAStream( chars, offset )
     compressed = decompressed.compress()
-    sys.stdout.write(compressed)
+    getattr(sys.stdout, 'buffer', sys.stdout).write(compressed)
 
     exit(0)
 
@@ -7,7 +7,7 @@
 
 import sys, os.path, optparse
 
-from msodumper import vbahelper
+from msodumper import vbahelper, ole
 
 def main():
 
@@ -15,11 +15,13 @@ def main():
     if len ( sys.argv ) > 1:
         offset = int(sys.argv[1])
 
-    chars = sys.stdin.read()
+    # large input is spilled into a temporary file instead of being kept in
+    # memory.
+    chars = ole.readFile('-')
 
     compressed = vbahelper.CompressedVBAStream( chars, offset )
     decompressed = compressed.decompress()
-    sys.stdout.write(decompressed)
+    getattr(sys.stdout, 'buffer', sys.stdout).write(decompressed)
 
     exit(0)
 
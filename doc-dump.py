@@ -5,7 +5,8 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 
-from msodumper import globals, docstream
+from msodumper import globals, docstream, ole
+import optparse
 import sys
 
 if not globals.PY3:
@@ -19,9 +20,8 @@ class DOCDumper:
         self.params = params
 
     def dump(self):
-        file = open(self.filepath, 'rb')
-        strm = docstream.createDOCFile(file.read(), self.params)
-        file.close()
+        chars = ole.readFile(self.filepath, self.params.mmap)
+        strm = docstream.createDOCFile(chars, self.params)
         dirnames = strm.getDirectoryNames()
         print('<?xml version="1.0"?>\n<streams ole-type="%s">' % strm.getName())
         if strm.error:
@@ -34,12 +34,40 @@ class DOCDumper:
 
 
 def main(args):
+    parser = optparse.OptionParser()
+    parser.add_option("--mmap", action="store_true", dest="mmap", default=False,
+                      help="Map the file into memory instead of reading it all at once.")
+    parser.add_option("-l", "--list", action="store_true", dest="list", default=False,
+                      help="Only list the streams of the file, reading just its header and directory.")
+    parser.add_option("--json-lines", action="store_true", dest="json_lines", default=False,
+                      help="Write one JSON object per record (JSON Lines) instead of the regular output.")
+    parser.add_option("-o", "--output", dest="output", default=None, metavar="FILE",
+                      help="Write the output to FILE, compressed if its name ends with .gz, .bz2 or .xz.")
+    options, args = parser.parse_args(args[1:])
+
+    if len(args) < 1:
+        globals.error("takes at least one argument\n")
+        parser.print_help()
+        sys.exit(1)
+
     params = globals.Params()
-    dumper = DOCDumper(args[1], params)
-    dumper.dump()
+    params.mmap = options.mmap
+    params.jsonLines = options.json_lines
+    with globals.OutputFile(options.output):
+        if options.list:
+            with ole.OleContainer(args[0], params) as container:
+                container.list()
+            return
+        dumper = DOCDumper(args[0], params)
+        if params.jsonLines:
+            with globals.JSONLinesOutput():
+                dumper.dump()
+        else:
+            dumper.dump()
 
 
 if __name__ == '__main__':
-    main(sys.argv)
+    with globals.OutputSink():
+        main(sys.argv)
 
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
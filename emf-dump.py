@@ -24,6 +24,10 @@ class EMFDumper:
 
 def main():
     parser = optparse.OptionParser()
+    parser.add_option("--json-lines", action="store_true", dest="json_lines", default=False,
+                      help="Write one JSON object per record (JSON Lines) instead of the regular output.")
+    parser.add_option("-o", "--output", dest="output", default=None, metavar="FILE",
+                      help="Write the output to FILE, compressed if its name ends with .gz, .bz2 or .xz.")
     options, args = parser.parse_args()
 
     if len(args) < 1:
@@ -31,11 +35,17 @@ def main():
         parser.print_help()
         sys.exit(1)
 
-    dumper = EMFDumper(args[0])
-    dumper.dump()
+    with globals.OutputFile(options.output):
+        dumper = EMFDumper(args[0])
+        if options.json_lines:
+            with globals.JSONLinesOutput():
+                dumper.dump()
+        else:
+            dumper.dump()
 
 
 if __name__ == '__main__':
-    main()
+    with globals.OutputSink():
+        main()
 
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+"""Measures how long it takes to import each dumper in a new interpreter,
+and which msodumper modules that imports.
+
+Execute this in the top directory: misc/import-time.py [runs]"""
+
+import subprocess
+import sys
+
+dumpers = ['doc-dump', 'xls-dump', 'ppt-dump', 'emf-dump', 'wmf-dump']
+
+
+def measure(dumper):
+    """Return the import time of dumper in microseconds and the msodumper
+    modules it imports, from the -X importtime output of python."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', '__import__("%s")' % dumper],
+                          stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    total = 0
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        dummy, cumulative, name = line.split('|')
+        name = name.strip()
+        if name == dumper:
+            total = int(cumulative)
+        elif name.startswith('msodumper.'):
+            modules.append(name[len('msodumper.'):])
+    return total, modules
+
+
+def main(args):
+    runs = 10
+    if len(args) > 1:
+        runs = int(args[1])
+    for dumper in dumpers:
+        results = [measure(dumper) for i in range(runs)]
+        best = min(total for total, modules in results)
+        print('%-10s %6.1f ms  %s' % (dumper, best / 1000.0, ' '.join(sorted(results[0][1]))))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
+
+# vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
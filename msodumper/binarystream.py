@@ -7,7 +7,111 @@
 
 from . import globals
 import struct
-from xml.sax.saxutils import quoteattr
+
+# What quoteattr() replaces in a value that contains both kinds of quotes;
+# not importing xml.sax.saxutils spares the dumpers importing urllib.
+quoteAttrTable = {ord('&'): '&amp;', ord('<'): '&lt;', ord('>'): '&gt;', ord('"'): '&quot;',
+                  ord('\n'): '&#10;', ord('\r'): '&#13;', ord('\t'): '&#9;'}
+
+# Number of escaped results of BinaryStream.getString() kept in the
+# stringCache of the current DumpContext before it is emptied.
+stringCacheSize = 4096
+
+
+class Field:
+    """A field of a Schema.
+
+    format is a struct format character, mask selects a bit-field of a Bits
+    container instead, and count makes the field an array.  The other
+    arguments are passed to BinaryStream.printAndSet() when dumping; silent
+    fields are only parsed."""
+    def __init__(self, name, format=None, mask=None, count=None, hexdump=True, dict=None, default=None, silent=False):
+        self.name = name
+        self.format = format
+        self.mask = mask
+        self.shift = 0
+        if mask:
+            while not (mask >> self.shift) & 1:
+                self.shift += 1
+        self.count = count
+        self.hexdump = hexdump
+        self.dict = dict
+        self.default = default
+        self.silent = silent
+
+
+class Bits:
+    """An integer of a Schema that is only made up of bit-fields, see Field."""
+    def __init__(self, format, fields):
+        self.format = format
+        self.fields = fields
+
+
+class Schema:
+    """A fixed-size structure, declared as a list of Field and Bits items.
+
+    The items are compiled once into a single struct.Struct, so reading the
+    structure is one unpack_from() call plus masks and shifts for the
+    bit-fields, instead of one read call per field."""
+    def __init__(self, items):
+        self.items = items
+        self.struct = struct.Struct("<" + "".join("%s%s" % (getattr(item, "count", None) or "", item.format) for item in items))
+        self.size = self.struct.size
+
+    def read(self, stream):
+        """Set the fields as attributes of stream, from its current position,
+        which is moved past the structure."""
+        if isinstance(stream.bytes, (bytes, bytearray, memoryview)):
+            values = self.struct.unpack_from(stream.bytes, stream.pos)
+        else:
+            values = stream.bytes.unpack_from(self.struct, stream.pos)
+        index = 0
+        for item in self.items:
+            if isinstance(item, Bits):
+                value = values[index]
+                for field in item.fields:
+                    setattr(stream, field.name, (value & field.mask) >> field.shift)
+                index += 1
+            elif item.count:
+                setattr(stream, item.name, list(values[index:index + item.count]))
+                index += item.count
+            else:
+                setattr(stream, item.name, values[index])
+                index += 1
+        stream.pos += self.size
+
+    def readAndDump(self, stream):
+        """read() and dump().  If the structure doesn't fit in the rest of
+        the bytes, the items are read and printed one at a time instead, so
+        the ones before the end are printed before struct.error is raised."""
+        if stream.pos + self.size <= len(stream.bytes):
+            self.read(stream)
+            self.dump(stream)
+            return
+        for item in self.items:
+            schema = Schema([item])
+            schema.read(stream)
+            schema.dump(stream)
+
+    def dump(self, stream):
+        """Print the fields that read() has set, the way printAndSet() does."""
+        for item in self.items:
+            if isinstance(item, Bits):
+                fields = item.fields
+            else:
+                fields = [item]
+            for field in fields:
+                if field.silent:
+                    continue
+                value = getattr(stream, field.name)
+                jsonl = globals.getContext().jsonl
+                if field.count and jsonl is not None:
+                    jsonl.setField(stream, field.name, value)
+                elif field.count:
+                    for i in range(field.count):
+                        print('<%s index="%d" value="%s"/>' % (field.name, i, value[i]))
+                else:
+                    stream.printAndSet(field.name, value, hexdump=field.hexdump, dict=field.dict, default=field.default)
 
 
 class BinaryStream:
@@ -26,12 +130,19 @@ class BinaryStream:
         setattr(self, key, value)
         if silent:
             return
-        attrs = ""
+        name = None
         if dict:
             if value in dict or default is None:
-                attrs += ' name="%s"' % dict.get(value, "INVALID")
+                name = dict.get(value, "INVALID")
             else:
-                attrs += ' name="%s"' % default
+                name = default
+        jsonl = globals.getContext().jsonl
+        if jsonl is not None:
+            jsonl.setField(self, key, value, name)
+            return
+        attrs = ""
+        if name is not None:
+            attrs += ' name="%s"' % name
         if hexdump and type(value) != float:
             value = hex(value)
         if offset:
@@ -42,21 +153,19 @@ class BinaryStream:
             print('<%s value="%s"%s>' % (key, value, attrs))
 
     def quoteAttr(self, value):
-        """Wrapper around xml.sax.saxutils.quoteattr, assumes the caller will put " around the result."""
+        """Escapes value like xml.sax.saxutils.quoteattr does, assumes the caller will put " around the result."""
 
         if globals.PY3:
             if isinstance(value, bytes):
-                # can't have bytes here, crashes later in saxutils
                 value = value.decode('cp1252')
-        ret = quoteattr("'" + value + "'")
-        return ret[2:len(ret) - 2]
+        return value.translate(quoteAttrTable)
 
     def getuInt8(self, bytes=None, pos=None):
-        if not bytes:
+        if bytes is None:
             bytes = self.bytes
-        if not pos:
+        if pos is None:
             pos = self.pos
-        return struct.unpack("<B", bytes[pos:pos + 1])[0]
+        return globals.unpackFrom(globals.UInt8, bytes, pos)
 
     def readuInt8(self):
         ret = self.getuInt8()
@@ -64,11 +173,11 @@ class BinaryStream:
         return ret
 
     def getuInt16(self, bytes=None, pos=None):
-        if not bytes:
+        if bytes is None:
             bytes = self.bytes
-        if not pos:
+        if pos is None:
             pos = self.pos
-        return struct.unpack("<H", bytes[pos:pos + 2])[0]
+        return globals.unpackFrom(globals.UInt16, bytes, pos)
 
     def readuInt16(self):
         ret = self.getuInt16()
@@ -76,11 +185,11 @@ class BinaryStream:
         return ret
 
     def getInt16(self, bytes=None, pos=None):
-        if not bytes:
+        if bytes is None:
             bytes = self.bytes
-        if not pos:
+        if pos is None:
             pos = self.pos
-        return struct.unpack("<h", bytes[pos:pos + 2])[0]
+        return globals.unpackFrom(globals.Int16, bytes, pos)
 
     def readInt16(self):
         ret = self.getInt16()
@@ -88,14 +197,15 @@ class BinaryStream:
         return ret
 
     def getuInt24(self):
-        return struct.unpack("<I", self.bytes[self.pos:self.pos + 3] + b"\x00")[0]
+        low = globals.unpackFrom(globals.UInt16, self.bytes, self.pos)
+        return low | (globals.unpackFrom(globals.UInt8, self.bytes, self.pos + 2) << 16)
 
     def getuInt32(self, bytes=None, pos=None):
-        if not bytes:
+        if bytes is None:
             bytes = self.bytes
-        if not pos:
+        if pos is None:
             pos = self.pos
-        return struct.unpack("<I", bytes[pos:pos + 4])[0]
+        return globals.unpackFrom(globals.UInt32, bytes, pos)
 
     def readuInt32(self):
         ret = self.getuInt32()
@@ -103,11 +213,11 @@ class BinaryStream:
         return ret
 
     def getInt32(self, bytes=None, pos=None):
-        if not bytes:
+        if bytes is None:
             bytes = self.bytes
-        if not pos:
+        if pos is None:
             pos = self.pos
-        return struct.unpack("<i", bytes[pos:pos + 4])[0]
+        return globals.unpackFrom(globals.Int32, bytes, pos)
 
     def readInt32(self):
         ret = self.getInt32()
@@ -115,11 +225,11 @@ class BinaryStream:
         return ret
 
     def getFloat32(self, bytes=None, pos=None):
-        if not bytes:
+        if bytes is None:
             bytes = self.bytes
-        if not pos:
+        if pos is None:
             pos = self.pos
-        return struct.unpack("<f", bytes[pos:pos + 4])[0]
+        return globals.unpackFrom(globals.Float32, bytes, pos)
 
     def readFloat32(self):
         ret = self.getFloat32()
@@ -127,11 +237,11 @@ class BinaryStream:
         return ret
 
     def getuInt64(self, bytes=None, pos=None):
-        if not bytes:
+        if bytes is None:
             bytes = self.bytes
-        if not pos:
+        if pos is None:
             pos = self.pos
-        return struct.unpack("<Q", bytes[pos:pos + 8])[0]
+        return globals.unpackFrom(globals.UInt64, bytes, pos)
 
     def readuInt64(self):
         ret = self.getuInt64()
@@ -139,23 +249,30 @@ class BinaryStream:
         return ret
 
     def __getString(self, limit):
-        bytes = []
-        count = 0
-        pos = self.pos
-        while True:
-            if (limit is not None) and count == limit:
-                break
-            i = self.getuInt8(pos=pos)
-            pos += 1
-            j = self.getuInt8(pos=pos)
-            pos += 1
-            if i != 0 or j != 0:
-                bytes.append(i)
-                bytes.append(j)
-            else:
-                break
-            count += 1
-        return (self.quoteAttr(globals.encodeName(globals.getUTF8FromUTF16("".join(map(lambda x: chr(x), bytes))))), pos)
+        start = self.pos
+        end = len(self.bytes)
+        if limit is not None:
+            end = min(start + 2 * limit, end)
+        pos = globals.findNullDoublet(self.bytes, start, end)
+        if pos >= 0:
+            raw, pos = self.bytes[start:pos], pos + 2
+        elif limit is not None and start + 2 * limit <= len(self.bytes):
+            raw, pos = self.bytes[start:end], end
+        else:
+            # Like reading it one character at a time would.
+            raise struct.error("unterminated UTF-16 string at offset %d" % start)
+        raw = bytes(raw)
+
+        stringCache = globals.getContext().stringCache
+        value = stringCache.get(raw)
+        if value is None:
+            if len(stringCache) >= stringCacheSize:
+                stringCache.clear()
+            # Each byte is a character, like chr() would give.
+            text = raw.decode('latin-1') if globals.PY3 else raw
+            value = self.quoteAttr(globals.encodeName(globals.getUTF8FromUTF16(text)))
+            stringCache[raw] = value
+        return (value, pos)
 
     def getString(self, limit=None):
         return self.__getString(limit)[0]
@@ -7,9 +7,10 @@
 from builtins import range
 import locale
 from . import globals
-from .binarystream import BinaryStream
+from .binarystream import BinaryStream, Schema, Field, Bits
 from . import docsprm
-from . import msodraw
+
+msodraw = globals.LazyModule('msodraw')
 
 
 def getWordModel(mainStream):
@@ -20,45 +21,49 @@ def getWordModel(mainStream):
 
 class FcCompressed(BinaryStream):
     """The FcCompressed structure specifies the location of text in the WordDocument Stream."""
+    schema = Schema([
+        Bits("I", [
+            Field("fc", mask=0x3fffffff),  # bits 0..29
+            Field("fCompressed", mask=0x40000000),
+            Field("r1", mask=0x80000000),
+        ]),
+    ])
+
     def __init__(self, bytes, mainStream, offset, size):
         BinaryStream.__init__(self, bytes, mainStream=mainStream)
         self.pos = offset
         self.size = size
-
-        buf = self.readuInt32()
-        self.fc = buf & ((2 ** 32 - 1) >> 2)  # bits 0..29
-        self.fCompressed = self.getBit(buf, 30)
-        self.r1 = self.getBit(buf, 31)
+        self.schema.read(self)
 
     def dump(self):
         print('<fcCompressed type="FcCompressed" offset="%d" size="%d bytes">' % (self.pos, self.size))
-        self.printAndSet("fc", self.fc)
-        self.printAndSet("fCompressed", self.fCompressed)
-        self.printAndSet("r1", self.r1)
+        self.schema.dump(self)
         print('</fcCompressed>')
 
 
 class Pcd(BinaryStream):
     """The Pcd structure specifies the location of text in the WordDocument Stream and additional properties for this text."""
+    schema = Schema([
+        Bits("H", [
+            Field("fNoParaLast", mask=0x0001),
+            Field("fR1", mask=0x0002),
+            Field("fDirty", mask=0x0004),
+            Field("fR2", mask=0x1fff),
+        ]),
+    ])
+
     def __init__(self, bytes, mainStream, offset, size):
         BinaryStream.__init__(self, bytes, mainStream=mainStream)
         self.pos = offset
         self.size = size
 
-        buf = self.readuInt16()
-        self.fNoParaLast = self.getBit(buf, 0)
-        self.fR1 = self.getBit(buf, 1)
-        self.fDirty = self.getBit(buf, 2)
-        self.fR2 = buf & (2 ** 13 - 1)
+        self.schema.read(self)
         self.fc = FcCompressed(self.bytes, self.mainStream, self.pos, 4)
         self.pos += 4
 
     def dump(self):
         print('<pcd type="Pcd" offset="%d" size="%d bytes">' % (self.pos, self.size))
-        self.printAndSet("fNoParaLast", self.fNoParaLast)
-        self.printAndSet("fR1", self.fR1)
-        self.printAndSet("fDirty", self.fDirty)
-        self.printAndSet("fR2", self.fR2)
+        self.schema.dump(self)
         self.fc.dump()
         print('</pcd>')
 
@@ -876,21 +881,25 @@ class SPgbPropOperand(BinaryStream):
 
 class MFPF(BinaryStream):
     """The MFPF structure specifies the type of picture data that is stored."""
+    mmDict = {
+        0x0064: "MM_SHAPE",
+        0x0066: "MM_SHAPEFILE",
+    }
+    schema = Schema([
+        Field("mm", "h", dict=mmDict, default="todo"),
+        Field("xExt", "H"),
+        Field("yExt", "H"),
+        Field("swHMF", "H"),
+    ])
+
     def __init__(self, parent):
         BinaryStream.__init__(self, parent.bytes)
         self.pos = parent.pos
         self.parent = parent
 
     def dump(self):
-        mmDict = {
-            0x0064: "MM_SHAPE",
-            0x0066: "MM_SHAPEFILE",
-        }
         print('<mfpf type="MFPF" offset="%d">' % self.pos)
-        self.printAndSet("mm", self.readInt16(), dict=mmDict, default="todo")
-        self.printAndSet("xExt", self.readuInt16())
-        self.printAndSet("yExt", self.readuInt16())
-        self.printAndSet("swHMF", self.readuInt16())
+        self.schema.readAndDump(self)
         self.parent.pos = self.pos
         print('</mfpf>')
 
@@ -898,6 +907,13 @@ class MFPF(BinaryStream):
 class PICF_Shape(BinaryStream):
     """The PICF_Shape structure specifies additional header information for
     pictures of type MM_SHAPE or MM_SHAPEFILE."""
+    schema = Schema([
+        Field("grf", "I"),
+        Field("padding1", "I"),
+        Field("mmpm", "H"),
+        Field("padding2", "I"),
+    ])
+
     def __init__(self, parent, name):
         BinaryStream.__init__(self, parent.bytes)
         self.pos = parent.pos
@@ -906,10 +922,7 @@ class PICF_Shape(BinaryStream):
 
     def dump(self):
         print('<%s type="PICF_Shape" offset="%d">' % (self.name, self.pos))
-        self.printAndSet("grf", self.readuInt32())
-        self.printAndSet("padding1", self.readuInt32())
-        self.printAndSet("mmpm", self.readuInt16())
-        self.printAndSet("padding2", self.readuInt32())
+        self.schema.readAndDump(self)
         self.parent.pos = self.pos
         print('</%s>' % self.name)
 
@@ -1184,6 +1197,11 @@ class PICMID(BinaryStream):
 class PICF(BinaryStream):
     """The PICF structure specifies the type of a picture, as well as the size
     of the picture and information about its border."""
+    schema = Schema([
+        Field("lcb", "i"),
+        Field("cbHeader", "h"),
+    ])
+
     def __init__(self, parent):
         BinaryStream.__init__(self, parent.bytes)
         self.pos = parent.pos
@@ -1192,8 +1210,7 @@ class PICF(BinaryStream):
     def dump(self):
         print('<picf type="PICF" offset="%d">' % self.pos)
         posOrig = self.pos
-        self.printAndSet("lcb", self.readInt32())
-        self.printAndSet("cbHeader", self.readInt16())
+        self.schema.readAndDump(self)
         assert self.cbHeader == 0x44
         self.mfpf = MFPF(self)
         self.mfpf.dump()
@@ -2944,6 +2961,17 @@ class Dop(BinaryStream):
 
 class FFID(BinaryStream):
     """The FFID structure specifies the font family and character pitch for a font."""
+    schema = Schema([
+        Bits("B", [
+            Field("ffid", mask=0xff),
+            Field("prq", mask=0x3),  # first two bits
+            Field("fTrueType", mask=0x4),  # 3rd bit
+            Field("unused1", mask=0x8),  # 4th bit
+            Field("ff", mask=0x70),  # 5-7th bits
+            Field("unused2", mask=0x80),  # 8th bit
+        ]),
+    ])
+
     def __init__(self, bytes, offset):
         BinaryStream.__init__(self, bytes)
         self.pos = offset
@@ -2951,50 +2979,56 @@ class FFID(BinaryStream):
         self.unused2 = None
 
     def dump(self):
-        self.ffid = self.readuInt8()
-
-        self.prq = (self.ffid & 0x3)  # first two bits
-        self.fTrueType = (self.ffid & 0x4) >> 2  # 3rd bit
-        self.unused1 = (self.ffid & 0x8) >> 3  # 4th bit
-        self.ff = (self.ffid & 0x70) >> 4  # 5-7th bits
-        self.unused2 = (self.ffid & 0x80) >> 7  # 8th bit
+        self.schema.read(self)
 
         print('<ffid value="%s" prq="%s" fTrueType="%s" ff="%s"/>' % (hex(self.ffid), hex(self.prq), self.fTrueType, hex(self.ff)))
 
 
 class PANOSE(BinaryStream):
     """The PANOSE structure defines the PANOSE font classification values for a TrueType font."""
+    schema = Schema([Field(i, "B") for i in ["bFamilyType", "bSerifStyle", "bWeight", "bProportion", "bContrast",
+                                             "bStrokeVariation", "bArmStyle", "bLetterform", "bMidline", "bHeight"]])
+
     def __init__(self, bytes, offset):
         BinaryStream.__init__(self, bytes)
         self.pos = offset
 
     def dump(self):
         print('<panose type="PANOSE" offset="%s" size="10 bytes">' % self.pos)
-        for i in ["bFamilyType", "bSerifStyle", "bWeight", "bProportion", "bContrast", "bStrokeVariation", "bArmStyle", "bLetterform", "bMidline", "bHeight"]:
-            self.printAndSet(i, self.readuInt8())
+        self.schema.readAndDump(self)
         print('</panose>')
 
 
 class FontSignature(BinaryStream):
     """Contains information identifying the code pages and Unicode subranges for which a given font provides glyphs."""
+    schema = Schema([
+        Field("fsUsb1", "I"),
+        Field("fsUsb2", "I"),
+        Field("fsUsb3", "I"),
+        Field("fsUsb4", "I"),
+        Field("fsCsb1", "I"),
+        Field("fsCsb2", "i"),
+    ])
+
     def __init__(self, bytes, offset):
         BinaryStream.__init__(self, bytes)
         self.pos = offset
 
     def dump(self):
-        fsUsb1 = self.readuInt32()
-        fsUsb2 = self.readuInt32()
-        fsUsb3 = self.readuInt32()
-        fsUsb4 = self.readuInt32()
-        fsCsb1 = self.readuInt32()
-        fsCsb2 = self.readInt32()
+        self.schema.read(self)
         print('<fontSignature fsUsb1="%s" fsUsb2="%s" fsUsb3="%s" fsUsb4="%s" fsCsb1="%s" fsCsb2="%s"/>' %
-              (hex(fsUsb1), hex(fsUsb2), hex(fsUsb3), hex(fsUsb4), hex(fsCsb1), hex(fsCsb2))
+              (hex(self.fsUsb1), hex(self.fsUsb2), hex(self.fsUsb3), hex(self.fsUsb4), hex(self.fsCsb1), hex(self.fsCsb2))
               )
 
 
 class FFN(BinaryStream):
     """The FFN structure specifies information about a font that is used in the document."""
+    schema = Schema([
+        Field("wWeight", "h", hexdump=False),
+        Field("chs", "B", hexdump=False),
+        Field("ixchSzAlt", "B"),
+    ])
+
     def __init__(self, bytes, mainStream, offset, size):
         BinaryStream.__init__(self, bytes, mainStream=mainStream)
         self.pos = offset
@@ -3004,9 +3038,7 @@ class FFN(BinaryStream):
         print('<ffn type="FFN" offset="%d" size="%d bytes">' % (self.pos, self.size))
         FFID(self.bytes, self.pos).dump()
         self.pos += 1
-        self.printAndSet("wWeight", self.readInt16(), hexdump=False)
-        self.printAndSet("chs", self.readuInt8(), hexdump=False)
-        self.printAndSet("ixchSzAlt", self.readuInt8())
+        self.schema.readAndDump(self)
         PANOSE(self.bytes, self.pos).dump()
         self.pos += 10
         FontSignature(self.bytes, self.pos).dump()
@@ -3995,6 +4027,19 @@ class PlcfGram(BinaryStream, PLC):
 class Grfhic(BinaryStream):
     """The grfhic structure is a set of HTML incompatibility flags that specify
     the HTML incompatibilities of a list structure."""
+    schema = Schema([
+        Bits("B", [
+            Field("fhicChecked", mask=0x01),
+            Field("fhicFormat", mask=0x02),
+            Field("fhicListText", mask=0x04),
+            Field("fhicPeriod", mask=0x08),
+            Field("fhicLeft1", mask=0x10),
+            Field("fhicListTab", mask=0x20),
+            Field("unused", mask=0x40),
+            Field("fhicBullet", mask=0x80),
+        ]),
+    ])
+
     def __init__(self, parent):
         BinaryStream.__init__(self, parent.bytes)
         self.pos = parent.pos
@@ -4002,21 +4047,27 @@ class Grfhic(BinaryStream):
 
     def dump(self):
         print('<grfhic type="grfhic">')
-        buf = self.readuInt8()
-        self.printAndSet("fhicChecked", self.getBit(buf, 0))
-        self.printAndSet("fhicFormat", self.getBit(buf, 1))
-        self.printAndSet("fhicListText", self.getBit(buf, 2))
-        self.printAndSet("fhicPeriod", self.getBit(buf, 3))
-        self.printAndSet("fhicLeft1", self.getBit(buf, 4))
-        self.printAndSet("fhicListTab", self.getBit(buf, 5))
-        self.printAndSet("unused", self.getBit(buf, 6))
-        self.printAndSet("fhicBullet", self.getBit(buf, 7))
+        self.schema.readAndDump(self)
         self.parent.pos = self.pos
         print('</grfhic>')
 
 
 class LSTF(BinaryStream):
     """The LSTF structure contains formatting properties that apply to an entire list."""
+    schema = Schema([
+        Field("lsid", "i"),
+        Field("tplc", "i"),
+        Field("rgistdPara", "h", count=9),
+        Bits("B", [
+            Field("fSimpleList", mask=0x01),
+            Field("unused1", mask=0x02),
+            Field("fAutoNum", mask=0x04),
+            Field("unused2", mask=0x08),
+            Field("fHybrid", mask=0x10),
+            Field("reserved1", mask=0xe0),  # 6..8th bits
+        ]),
+    ])
+
     def __init__(self, plfLst, index):
         BinaryStream.__init__(self, plfLst.bytes)
         self.pos = plfLst.pos
@@ -4025,17 +4076,7 @@ class LSTF(BinaryStream):
 
     def dump(self):
         print('<lstf type="LSTF" index="%d" offset="%d" size="%d bytes">' % (self.index, self.pos, self.size))
-        self.printAndSet("lsid", self.readInt32())
-        self.printAndSet("tplc", self.readInt32())
-        for i in range(9):
-            print('<rgistdPara index="%d" value="%s"/>' % (i, self.readInt16()))
-        buf = self.readuInt8()
-        self.printAndSet("fSimpleList", self.getBit(buf, 0))
-        self.printAndSet("unused1", self.getBit(buf, 1))
-        self.printAndSet("fAutoNum", self.getBit(buf, 2))
-        self.printAndSet("unused2", self.getBit(buf, 3))
-        self.printAndSet("fHybrid", self.getBit(buf, 4))
-        self.printAndSet("reserved1", (buf & 0xe0) >> 5)  # 6..8th bits
+        self.schema.readAndDump(self)
         Grfhic(self).dump()
         print('</lstf>')
 
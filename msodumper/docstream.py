@@ -128,7 +128,8 @@ def createDOCFile(chars, params):
         hasGsf = False
 
     if hasGsf:
-        return GsfDOCFile(chars, params, gsf)
+        # gsf wants a real buffer, not a view over a mapped file.
+        return GsfDOCFile(bytes(chars), params, gsf)
     else:
         return DOCFile(chars, params)
 
@@ -5,8 +5,8 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 
-from .binarystream import BinaryStream
-from . import wmfrecord
+from .binarystream import BinaryStream, Schema, Field
+from . import wmfrecord, globals
 import base64
 
 
@@ -62,7 +62,9 @@ class EMFStream(BinaryStream):
     def dump(self):
         print('<stream type="EMF" size="%d">' % self.size)
         emrHeader = EmrHeader(self)
+        globals.beginRecord(self.pos, self.getuInt32(), "EMR_HEADER", self.getuInt32(pos=self.pos + 4))
         emrHeader.dump()
+        globals.endRecord()
         for i in range(emrHeader.header.Records):
             id = self.getuInt32()
             record = RecordType.get(id, ["INVALID"])
@@ -70,6 +72,7 @@ class EMFStream(BinaryStream):
             size = self.getuInt32(pos=self.pos + 4)
             # EmrHeader is already dumped
             if i:
+                globals.beginRecord(self.pos, id, type, size)
                 print('<record index="%s" type="%s">' % (i, type))
                 if len(record) > 1:
                     handler = record[1](self)
@@ -77,6 +80,7 @@ class EMFStream(BinaryStream):
                 else:
                     print('<todo/>')
                 print('</record>')
+                globals.endRecord()
             # EMR_EOF
             if type == "EMR_EOF":
                 break
@@ -847,13 +851,17 @@ class RegionDataHeader(EMFRecord):
 
 class EmrHeader(EMFRecord):
     """The EMR_HEADER record types define the starting points of EMF metafiles."""
+    schema = Schema([
+        Field("Type", "I"),
+        Field("Size", "I", hexdump=False),
+    ])
+
     def __init__(self, parent):
         EMFRecord.__init__(self, parent)
 
     def dump(self):
         print('<emrHeader>')
-        self.printAndSet("Type", self.readuInt32())
-        self.printAndSet("Size", self.readuInt32(), hexdump=False)
+        self.schema.readAndDump(self)
         self.header = Header(self)
         self.header.dump()
         if self.Size >= 100:
@@ -865,6 +873,18 @@ class EmrHeader(EMFRecord):
 
 class Header(EMFRecord):
     """The Header object defines the EMF metafile header."""
+    schema = Schema([
+        Field("RecordSignature", "I", dict=FormatSignature),
+        Field("Version", "I"),
+        Field("Bytes", "I", hexdump=False),
+        Field("Records", "I", hexdump=False),
+        Field("Handles", "H", hexdump=False),
+        Field("Reserved", "H", hexdump=False),
+        Field("nDescription", "I", hexdump=False),
+        Field("offDescription", "I", hexdump=False),
+        Field("nPalEntries", "I", hexdump=False),
+    ])
+
     def __init__(self, parent):
         EMFRecord.__init__(self, parent)
 
@@ -873,15 +893,7 @@ class Header(EMFRecord):
         print("<header>")
         wmfrecord.RectL(self, "Bounds").dump()
         wmfrecord.RectL(self, "Frame").dump()
-        self.printAndSet("RecordSignature", self.readuInt32(), dict=FormatSignature)
-        self.printAndSet("Version", self.readuInt32())
-        self.printAndSet("Bytes", self.readuInt32(), hexdump=False)
-        self.printAndSet("Records", self.readuInt32(), hexdump=False)
-        self.printAndSet("Handles", self.readuInt16(), hexdump=False)
-        self.printAndSet("Reserved", self.readuInt16(), hexdump=False)
-        self.printAndSet("nDescription", self.readuInt32(), hexdump=False)
-        self.printAndSet("offDescription", self.readuInt32(), hexdump=False)
-        self.printAndSet("nPalEntries", self.readuInt32(), hexdump=False)
+        self.schema.readAndDump(self)
         wmfrecord.SizeL(self, "Device").dump()
         wmfrecord.SizeL(self, "Millimeters").dump()
         print("</header>")
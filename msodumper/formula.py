@@ -796,7 +796,7 @@ associated token classes will be without the leading underscore (_)."""
             # We are sometimes called with None bytes
             self.strm = globals.ByteStream(bytes)
         except:
-            if not globals.params.catchExceptions:
+            if not globals.getContext().params.catchExceptions:
                 raise
             globals.error("FormulaParser: init called with None source\n")
             self.strm = globals.ByteStream("")
@@ -5,8 +5,8 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 from builtins import range
-import sys, struct, math, zipfile, io
-from . import xmlpp
+import sys, struct, math, io, threading, importlib, bisect
+from . import xmlpp, hexdump, jsonlines
 
 PY3 = sys.version > '3'
 
@@ -66,10 +66,13 @@ class Params(object):
         self.noRawDump = False
         self.catchExceptions = False
         self.utf8 = False
-        
-# Global parameters / run configuration, to be set up by the main
-# program during initialization
-params = Params()
+        self.mmap = False
+        self.list = False
+        self.jsonLines = False
+        self.includedRecords = set()
+        self.excludedRecords = set()
+        self.selectedSheets = None
+
 
 class ByteStream(object):
 
@@ -104,18 +107,29 @@ class ByteStream(object):
     def isEndOfRecord (self):
         return (self.pos == self.size)
 
+    def __readLayout (self, layout):
+        if self.pos + layout.size > self.size:
+            # raises the error.
+            self.readBytes(layout.size)
+        value = unpackFrom(layout, self.bytes, self.pos)
+        self.pos += layout.size
+        return value
+
     def readUnsignedInt (self, length):
+        if length in unsignedLayouts:
+            return self.__readLayout(unsignedLayouts[length])
         bytes = self.readBytes(length)
         return getUnsignedInt(bytes)
 
     def readSignedInt (self, length):
+        if length in signedLayouts:
+            return self.__readLayout(signedLayouts[length])
         bytes = self.readBytes(length)
         return getSignedInt(bytes)
 
     def readDouble (self):
         # double is always 8 bytes.
-        bytes = self.readBytes(8)
-        return getDouble(bytes)
+        return self.__readLayout(Float64)
 
     def readUnicodeString (self, textLen=None):
         # First 2-bytes contains the text length, followed by a 1-byte flag.
@@ -145,6 +159,47 @@ class ByteStream(object):
             self.pos = self.size
 
 
+class LazyModule(object):
+    """A module of this package that is only imported when one of its
+attributes is first used.  The dumpers are often run as short-lived
+processes, and most files need only some of the record modules."""
+
+    def __init__ (self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__ (self, attr):
+        if self.__module is None:
+            self.__module = importlib.import_module("." + self.__name, __package__)
+        return getattr(self.__module, attr)
+
+class LazyHandler(object):
+    """A handler class in a table of record types, looked up in its module
+when it's first called."""
+
+    def __init__ (self, module, name):
+        self.module = module
+        self.name = name
+        self.handler = None
+
+    def __call__ (self, *args, **kwargs):
+        if self.handler is None:
+            self.handler = getattr(self.module, self.name)
+        return self.handler(*args, **kwargs)
+
+class HandlerRegistry(object):
+    """Stands for the handler module name in a table of record types: its
+attributes are LazyHandler objects, so building the table doesn't import the
+module, reading the first record that has a handler does."""
+
+    def __init__ (self, name):
+        self.__module = LazyModule(name)
+
+    def __getattr__ (self, name):
+        handler = LazyHandler(self.__module, name)
+        setattr(self, name, handler)
+        return handler
+
 def getValueOrUnknown (list, idx, errmsg='(unknown)'):
     listType = type(list)
     if listType == type([]):
@@ -158,10 +213,8 @@ def getValueOrUnknown (list, idx, errmsg='(unknown)'):
 
     return errmsg
 
-textdump = b""
-
 def dumptext():
-    data = textdump.replace(b"\r", b"\n")
+    data = getContext().textdump.replace(b"\r", b"\n")
     if sys.platform == "win32":
         import msvcrt
         msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
@@ -170,20 +223,292 @@ def dumptext():
     else:
         sys.stdout.write(data)
 
+# Size of the buffer of an OutputSink, in characters or bytes.
+OutputBufferSize = 1024*1024
+
+class NullOutput(object):
+    """Output target that discards everything, useful for benchmarking."""
+    def write (self, data):
+        return len(data)
+
+    def flush (self):
+        pass
+
+    def close (self):
+        pass
+
+def openOutput (path):
+    """Open a binary output target: stdout for '-', a compressed file for
+paths ending with .gz, .bz2 or .xz, a plain file otherwise."""
+    if path == '-':
+        return getattr(sys.stdout, 'buffer', sys.stdout)
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'wb')
+    if path.endswith('.bz2'):
+        import bz2
+        return bz2.BZ2File(path, 'wb')
+    if path.endswith('.xz'):
+        import lzma
+        return lzma.open(path, 'wb')
+    return open(path, 'wb')
+
+class OutputSink(object):
+    """Buffers the output of output() and print(), and writes it to a binary
+target (a file, a BytesIO, a NullOutput...) in large blocks, encoded as
+UTF-8.
+
+Used as a context manager, the sink is installed as the target of output()
+and as sys.stdout, then flushed and uninstalled on exit."""
+
+    def __init__ (self, target=None, bufferSize=OutputBufferSize):
+        if target is None:
+            target = openOutput('-')
+        self.target = target
+        self.bufferSize = bufferSize
+        self.texts = []   # pending str fragments
+        self.chunks = []  # pending encoded fragments, before self.texts
+        self.size = 0
+        self.encoding = 'utf-8'
+        self.buffer = self  # for code writing bytes to sys.stdout.buffer
+        self.prevSink = None
+        self.prevStdout = None
+
+    def write (self, data):
+        if type(data) == type(u''):
+            self.texts.append(data)
+        else:
+            if len(self.texts) > 0:
+                self.__encodeTexts()
+            self.chunks.append(data)
+        self.size += len(data)
+        if self.size >= self.bufferSize:
+            self.flush()
+        return len(data)
+
+    def __encodeTexts (self):
+        self.chunks.append("".join(self.texts).encode('utf-8', 'backslashreplace'))
+        self.texts = []
+
+    def flush (self):
+        if len(self.texts) > 0:
+            self.__encodeTexts()
+        if len(self.chunks) > 0:
+            data = b"".join(self.chunks)
+            self.chunks = []
+            self.size = 0
+            self.target.write(data)
+        self.target.flush()
+
+    def fileno (self):
+        return self.target.fileno()
+
+    def isatty (self):
+        return False
+
+    def close (self):
+        """Flush the buffer, the target stays open: it belongs to the caller."""
+        self.flush()
+
+    def __enter__ (self):
+        self.context = getContext()
+        self.prevSink = self.context.outputSink
+        self.context.outputSink = self
+        _acquireStdout()
+        return self
+
+    def __exit__ (self, excType, excValue, traceback):
+        try:
+            self.close()
+        finally:
+            self.context.outputSink = self.prevSink
+            _releaseStdout()
+
+class OutputFile(object):
+    """Context manager sending the output of the current dump to the file at
+path, opened with openOutput(), so the compression follows the extension.
+With None or '-' as the path, the output stays where it was."""
+
+    def __init__ (self, path):
+        self.path = path
+        self.target = None
+        self.sink = None
+
+    def __enter__ (self):
+        if self.path is None or self.path == '-':
+            return self
+        self.target = openOutput(self.path)
+        self.sink = OutputSink(self.target)
+        self.sink.__enter__()
+        return self
+
+    def __exit__ (self, excType, excValue, traceback):
+        if self.target is None:
+            return
+        try:
+            self.sink.__exit__(excType, excValue, traceback)
+        finally:
+            self.target.close()
+
+class ContextStdout(object):
+    """Replaces sys.stdout while output sinks are in use, so that print()
+writes to the sink of the dump running in the current thread."""
+
+    def __init__ (self, stdout):
+        self.stdout = stdout
+
+    def __target (self):
+        sink = getContext().outputSink
+        if sink is not None:
+            return sink
+        return self.stdout
+
+    def write (self, data):
+        return self.__target().write(data)
+
+    def flush (self):
+        self.__target().flush()
+
+    @property
+    def buffer (self):
+        return self.__target().buffer
+
+    def __getattr__ (self, name):
+        return getattr(self.stdout, name)
+
+_stdoutLock = threading.Lock()
+_stdoutUsers = 0
+_savedStdout = None
+
+def _acquireStdout ():
+    global _stdoutUsers, _savedStdout
+    with _stdoutLock:
+        if _stdoutUsers == 0:
+            _savedStdout = sys.stdout
+            sys.stdout = ContextStdout(sys.stdout)
+        _stdoutUsers += 1
+
+def _releaseStdout ():
+    global _stdoutUsers, _savedStdout
+    with _stdoutLock:
+        _stdoutUsers -= 1
+        if _stdoutUsers == 0:
+            sys.stdout = _savedStdout
+            _savedStdout = None
+
+class DumpContext(object):
+    """The state of one dump run: its params, output sink and the text
+collected for --dump-text.
+
+Used as a context manager, the context becomes the current one of the
+calling thread, so dumps can run concurrently in threads of one process,
+each in its own context.  Outside of any context, getContext() returns the
+default context, which the command line tools set up."""
+
+    def __init__ (self, params=None, outputSink=None):
+        if params is None:
+            params = Params()
+        self.params = params
+        self.outputSink = outputSink
+        self.textdump = b""
+        self.jsonl = None  # jsonlines.Writer in JSON Lines mode
+        # escaped results of BinaryStream.getString(), by raw bytes: the
+        # same style and font names tend to be repeated in a document.
+        self.stringCache = {}
+
+    def __enter__ (self):
+        _contextStack().append(self)
+        if self.outputSink is not None:
+            _acquireStdout()
+        return self
+
+    def __exit__ (self, excType, excValue, traceback):
+        try:
+            if self.outputSink is not None:
+                self.outputSink.close()
+        finally:
+            _contextStack().pop()
+            if self.outputSink is not None:
+                _releaseStdout()
+
+defaultContext = DumpContext()
+# Deprecated: the params of the default context, use getContext().params.
+params = defaultContext.params
+_threadState = threading.local()
+
+def _contextStack ():
+    if not hasattr(_threadState, 'contexts'):
+        _threadState.contexts = []
+    return _threadState.contexts
+
+def getContext ():
+    """Return the DumpContext of the dump running in the current thread."""
+    contexts = _contextStack()
+    if len(contexts) > 0:
+        return contexts[-1]
+    return defaultContext
+
+class JSONLinesOutput(object):
+    """Context manager switching the current dump to JSON Lines output: the
+records are written to the current output as JSON objects, see jsonlines.py,
+and the regular text output is discarded."""
+
+    def __enter__ (self):
+        self.context = getContext()
+        target = self.context.outputSink
+        if target is None:
+            target = sys.stdout
+        self.writer = jsonlines.Writer(target)
+        self.context.jsonl = self.writer
+        self.discard = OutputSink(NullOutput())
+        self.discard.__enter__()
+        return self.writer
+
+    def __exit__ (self, excType, excValue, traceback):
+        try:
+            self.writer.close()
+        finally:
+            self.discard.__exit__(excType, excValue, traceback)
+            self.context.jsonl = None
+
+def beginRecord (offset, opcode, name, size):
+    """Start a record of the JSON Lines output, if that's enabled."""
+    jsonl = getContext().jsonl
+    if jsonl is not None:
+        jsonl.beginRecord(offset, opcode, name, size)
+
+def endRecord ():
+    jsonl = getContext().jsonl
+    if jsonl is not None:
+        jsonl.endRecord()
+
+def outputEnabled (recordType = -1):
+    """Whether output() would print anything for recordType, so that callers
+can avoid formatting output that is filtered anyway."""
+    context = getContext()
+    params = context.params
+    if params.noStructOutput or context.jsonl is not None:
+        return False
+    return recordType == -1 or not params.dumpedIds or recordType in params.dumpedIds
+
 # Write msg to stdout, as bytes (encode it if needed)
 def output (msg, recordType = -1):
+    if not outputEnabled(recordType):
+        return
+    outputSink = getContext().outputSink
+    if outputSink is not None:
+        outputSink.write(msg)
+        return
     if type(msg) == type(u''):
         msg = msg.encode('utf-8')
-    if params.noStructOutput:
-        return
-    if recordType == -1 or not params.dumpedIds or \
-           recordType in params.dumpedIds:
-        if PY3:
-            sys.stdout.buffer.write(msg)
-        else:
-            sys.stdout.write(msg)
+    if PY3:
+        sys.stdout.buffer.write(msg)
+    else:
+        sys.stdout.write(msg)
 
 def outputln(msg, recordType = -1):
+    if not outputEnabled(recordType):
+        return
     if type(msg) == type(u''):
         output(msg + "\n", recordType)
     else:
@@ -195,9 +520,16 @@ class utfwriter:
         output(s)
 
 def error (msg):
+    outputSink = getContext().outputSink
+    if outputSink is not None:
+        # keep the message in order with the buffered output
+        outputSink.flush()
     sys.stderr.write("Error: %s\n"%msg)
 
 def debug (msg):
+    outputSink = getContext().outputSink
+    if outputSink is not None:
+        outputSink.flush()
     sys.stderr.write("DEBUG: %s\n"%msg)
 
 def nulltrunc(bytes):
@@ -238,23 +570,22 @@ def encodeName (name, lowOnly = False, lowLimit = 0x20):
     return newname
 
 # Python3 only. Same as above but accept bytes as input.
+# str.translate() tables of _encodeNameBytes(), by (lowOnly, lowLimit).
+_encodeNameTables = {}
+
 def _encodeNameBytes (name, n, lowOnly = False, lowLimit = 0x20):
     """Encode name that contains unprintable characters."""
 
-    newname = ''
-    for i in range(0, n):
-        if name[i] == b'&'[0]:
-            newname += "&amp;"
-        elif name[i] == '<'[0]:
-            newname += b"&lt;"
-        elif name[i] == '>'[0]:
-            newname += b"&gt;"
-        elif name[i] < lowLimit or ((not lowOnly) and name[i] >= 127):
-            newname += "\\x%2.2X"%name[i]
-        else:
-            newname += chr(name[i])
-
-    return newname
+    key = (lowOnly, lowLimit)
+    if key not in _encodeNameTables:
+        table = {}
+        for i in range(0, 256):
+            if i < lowLimit or ((not lowOnly) and i >= 127):
+                table[i] = "\\x%2.2X"%i
+        # '<' and '>' are left alone, quoteattr() takes care of them.
+        table[ord('&')] = "&amp;"
+        _encodeNameTables[key] = table
+    return name[0:n].decode('latin-1').translate(_encodeNameTables[key])
     
 # Uncompress "compressed" UTF-16. This compression strips high bytes
 # from a string when they are all 0. Just restore them.
@@ -271,18 +602,17 @@ class UnicodeRichExtText(object):
         self.phoneticBytes = []
 
 # Search sorted list for first element strictly bigger than input
-# value. Should be binary search, but CONTINUE record offsets list are
-# usually small. Return list size if value >= last list element
+# value. Return list size if value >= last list element. Large SST
+# records have thousands of CONTINUE record offsets, and this is called
+# for every string.
 def findFirstBigger(ilist, value):
-    i = 0
-    while i < len(ilist) and value >= ilist[i]:
-        i +=1
-    return i
+    return bisect.bisect_right(ilist, value)
 
 def getUnicodeRichExtText (bytes, offset = 0, rofflist = []):
     if len(rofflist) == 0:
         rofflist = [len(bytes)]
     ret = UnicodeRichExtText()
+    params = getContext().params
     # Avoid myriad of messages when in "catching" mode
     if params.catchExceptions and (bytes is None or len(bytes) == 0):
         return ret, 0
@@ -405,7 +735,7 @@ Note the following:
         totalByteLen += textLen # double the text length since each char is 2 bytes.
         text = strm.readBytes(2*textLen).decode('UTF-16LE', errors='replace')
     else:
-        if params.utf8:
+        if getContext().params.utf8:
             # Compressed Unicode-> latin1
             text = strm.readBytes(textLen).decode('cp1252')
         else:
@@ -428,9 +758,9 @@ else:
             return '.'
 
 def dumpBytes (chars, subDivide=None):
-    if params.noStructOutput or params.noRawDump:
+    params = getContext().params
+    if params.noRawDump or not outputEnabled():
         return
-    line = 0
     subDivideLine = None
     if subDivide != None:
         subDivideLine = subDivide/16
@@ -441,68 +771,14 @@ def dumpBytes (chars, subDivide=None):
         return
 
     labelWidth = int(math.ceil(math.log(charLen, 10)))
-    lineBuf = '' # bytes interpreted as chars at the end of each line
-    i = 0
-    for i in range(0, charLen):
-        if (i+1)%16 == 1:
-            # print line header with seek position
-            fmt = "%%%d.%dd: "%(labelWidth, labelWidth)
-            output(fmt%i)
-
-        byte = indexbytes(chars, i)
-        lineBuf += toCharOrDot(chars[i])
-        output("%2.2X "%byte)
-
-        if (i+1)%4 == 0:
-            # put extra space at every 4 bytes.
-            output(" ")
-
-        if (i+1)%16 == 0:
-            # end of line
-            output (lineBuf)
-            output("\n")
-            if subDivideLine != None and (line+1)%subDivideLine == 0:
-                output("\n")
-            lineBuf = ''
-            line += 1
-
-    if len(lineBuf) > 0:
-        # pad with white space so that the line string gets aligned.
-        i += 1
-        while True:
-            output ("   ")
-            if (i+1)%4 == 0:
-                # put extra space at every 4 bytes.
-                output(" ")
-            if (i+1) % 16 == 0:
-                # end of line
-                break
-            i += 1
-        output (lineBuf)
-        output("\n")
+    hexdump.dumpOffsetLines(chars, output, labelWidth, subDivideLine)
 
 def getSectorPos (secID, secSize):
     return 512 + secID*secSize
 
 
 def getRawBytes (bytes, spaced=True, reverse=True):
-    text = ''
-    for b in bytes:
-        if type(b) == type(''):
-            b = ord(b)
-        if len(text) == 0:
-            text = "%2.2X"%b
-        elif spaced:
-            if reverse:
-                text = "%2.2X "%b + text
-            else:
-                text += " %2.2X"%b
-        else:
-            if reverse:
-                text = "%2.2X"%b + text
-            else:
-                text += "%2.2X"%b
-    return text
+    return hexdump.formatHex(bytes, spaced, reverse)
 
 
 # TBD: getTextBytes is now only called from pptrecord.
@@ -515,24 +791,40 @@ def getTextBytes (bytes):
 def toTextBytes (bytes):
     return bytes
 
+# Precompiled little endian layouts of the primitive types.  Read them with
+# unpackFrom(), which needs no intermediate slice of the buffer.
+Int8    = struct.Struct('b')
+UInt8   = struct.Struct('B')
+Int16   = struct.Struct('<h')
+UInt16  = struct.Struct('<H')
+Int32   = struct.Struct('<l')
+UInt32  = struct.Struct('<L')
+UInt64  = struct.Struct('<Q')
+Float32 = struct.Struct('<f')
+Float64 = struct.Struct('<d')
+
+# layouts by size in bytes.
+signedLayouts = {1: Int8, 2: Int16, 4: Int32}
+unsignedLayouts = {1: UInt8, 2: UInt16, 4: UInt32, 8: UInt64}
+
+plainBufferTypes = (bytes, bytearray, memoryview)
+
+def unpackFrom (layout, buffer, pos):
+    """Return the value of a precompiled layout at pos in buffer.  buffer is
+bytes-like, or provides its own unpack_from() like ole.SectorChainView."""
+    if type(buffer) not in plainBufferTypes and hasattr(buffer, 'unpack_from'):
+        return buffer.unpack_from(layout, pos)[0]
+    return layout.unpack_from(buffer, pos)[0]
+
 def getSignedInt (bytes):
     # little endian
     n = len(bytes)
     if n == 0:
         return 0
 
-    text = toTextBytes(bytes)
-    if n == 1:
-        # byte - 1 byte
-        return struct.unpack('b', text)[0]
-    elif n == 2:
-        # short - 2 bytes
-        return struct.unpack('<h', text)[0]
-    elif n == 4:
-        # int, long - 4 bytes
-        return struct.unpack('<l', text)[0]
-
-    raise ByteConvertError
+    if n not in signedLayouts:
+        raise ByteConvertError
+    return signedLayouts[n].unpack(toTextBytes(bytes))[0]
 
 
 def getUnsignedInt (bytes):
@@ -541,21 +833,9 @@ def getUnsignedInt (bytes):
     if n == 0:
         return 0
 
-    text = toTextBytes(bytes)
-    if n == 1:
-        # byte - 1 byte
-        return struct.unpack('B', text)[0]
-    elif n == 2:
-        # short - 2 bytes
-        return struct.unpack('<H', text)[0]
-    elif n == 4:
-        # int, long - 4 bytes
-        return struct.unpack('<L', text)[0]
-    elif n == 8:
-        # long long - 8 bytes
-        return struct.unpack('<Q', text)[0]
-
-    raise ByteConvertError
+    if n not in unsignedLayouts:
+        raise ByteConvertError
+    return unsignedLayouts[n].unpack(toTextBytes(bytes))[0]
 
 
 def getFloat (bytes):
@@ -563,8 +843,7 @@ def getFloat (bytes):
     if n == 0:
         return 0.0
 
-    text = toTextBytes(bytes)
-    return struct.unpack('<f', text)[0]
+    return Float32.unpack(toTextBytes(bytes))[0]
 
 
 def getDouble (bytes):
@@ -572,19 +851,37 @@ def getDouble (bytes):
     if n == 0:
         return 0.0
 
-    text = toTextBytes(bytes)
-    return struct.unpack('<d', text)[0]
+    return Float64.unpack(toTextBytes(bytes))[0]
+
+def findNullDoublet (bytes, start=0, end=None):
+    """Return the position of the first null doublet in bytes[start:end] that
+is at an even offset from start (a UTF-16 terminator), or -1."""
+    if end == None:
+        end = len(bytes)
+    if hasattr(bytes, 'find'):
+        pos = bytes.find(b"\0\0", start, end)
+        while pos >= 0 and (pos - start) % 2:
+            pos = bytes.find(b"\0\0", pos + 1, end)
+        return pos
+
+    # memoryviews and views of sector chains: search in chunks of an even
+    # size, so that no doublet spans two chunks.
+    while start < end:
+        chunk = bytes[start:min(start + 4096, end)]
+        pos = findNullDoublet(chunk.tobytes() if type(chunk) == memoryview else chunk)
+        if pos >= 0:
+            return start + pos
+        start += 4096
+    return -1
 
 def getUTF8FromUTF16 (bytes):
     # little endian utf-16 strings
-    loopCount = len(bytes) // 2
 
     # Truncate input to first null doublet
-    for i in range(0, loopCount):
-        if indexbytes(bytes, i*2) == 0:
-            if indexbytes(bytes, i*2+1) == 0:
-                bytes = bytes[0:i*2]
-                break
+    if type(bytes) != type(u'') or not PY3:
+        pos = findNullDoublet(bytes)
+        if pos >= 0:
+            bytes = bytes[0:pos]
 
     # Convert from utf-16 and return utf-8, using markers for
     # conversion errors
@@ -603,6 +900,7 @@ class StreamWrap(object):
             self.printer(line)
 
 def outputZipContent (bytes, printer, width=80):
+    import zipfile
     printer("Zipped content:")
     rawFile = io.BytesIO(bytes)
     zipFile = zipfile.ZipFile(rawFile)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+"""Hex dump formatting shared by the dumpers.
+
+Lines are formatted 16 bytes at a time with bytes.hex(), and the character
+column with a single translate() call, instead of formatting each byte on
+its own."""
+
+# Bytes that are shown as themselves in the character column, others are
+# shown as '.', like globals.toCharOrDot() does.
+printableTable = bytes(c if 32 < c < 127 else ord('.') for c in range(256))
+
+# Number of lines formatted before they are written out at once.
+blockLines = 4096
+
+
+def toBytes(data):
+    """Return data (bytes, bytearray, memoryview, list of ints or a str of
+    byte values) as bytes."""
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, str):
+        return data.encode('latin-1')
+    return bytes(data)
+
+
+def formatHex(data, spaced=True, reverse=False):
+    """Return data as upper-case hex digits, separated by spaces if spaced,
+    with the last byte first if reverse."""
+    data = toBytes(data)
+    if reverse:
+        data = data[::-1]
+    if spaced:
+        return data.hex(' ').upper()
+    return data.hex().upper()
+
+
+def formatChars(data):
+    """Return the character column of data."""
+    return toBytes(data).translate(printableTable).decode('ascii')
+
+
+def formatGroupedLine(line):
+    """Return the hex column of at most 16 bytes, padded to the width of a
+    full line, with an extra space after every 4 bytes."""
+    h = line.hex(' ').upper().ljust(47)
+    return "%s  %s  %s  %s  " % (h[0:11], h[12:23], h[24:35], h[36:47])
+
+
+def writeBlocks(lines, write):
+    """Pass the strings of lines to write, a block at a time."""
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) == blockLines:
+            write("".join(block))
+            block = []
+    if block:
+        write("".join(block))
+
+
+def dumpOffsetLines(data, write, labelWidth, subDivideLine=None):
+    """The lines of globals.dumpBytes(): decimal offset, hex column grouped
+    by 4 bytes and character column, with an empty line after every
+    subDivideLine lines."""
+    data = toBytes(data)
+    fmt = "%%%d.%dd: " % (labelWidth, labelWidth)
+
+    def lines():
+        for index, pos in enumerate(range(0, len(data), 16)):
+            line = data[pos:pos + 16]
+            yield "%s%s%s\n" % (fmt % pos, formatGroupedLine(line), line.translate(printableTable).decode('ascii'))
+            if len(line) == 16 and subDivideLine is not None and (index + 1) % subDivideLine == 0:
+                yield "\n"
+    writeBlocks(lines(), write)
+
+
+def dumpLabelledLines(data, write, label, chars=True):
+    """Lines of label, hex column and (if chars) character column, as printed
+    for the raw bytes of records."""
+    data = toBytes(data)
+
+    def lines():
+        for pos in range(0, len(data), 16):
+            line = data[pos:pos + 16]
+            if chars:
+                yield "%s%s   %s\n" % (label, line.hex(' ').upper().ljust(47), line.translate(printableTable).decode('ascii'))
+            else:
+                yield "%s%s \n" % (label, line.hex(' ').upper())
+    writeBlocks(lines(), write)
+
+# vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
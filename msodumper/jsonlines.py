@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+"""JSON Lines output of the dumpers: one JSON object per record.
+
+Each object has the offset, opcode, name and size of the record, its nesting
+depth and its parsed fields.  Fields set outside of any record (e.g. by the
+structures of a Word document, which has no records) get a record per
+structure, with the class name as the name."""
+
+import json
+
+
+class Record:
+    def __init__(self, offset, opcode, name, size, depth, owner=None):
+        self.offset = offset
+        self.opcode = opcode
+        self.name = name
+        self.size = size
+        self.depth = depth
+        self.owner = owner
+        self.fields = {}
+        self.lines = []
+        self.written = False
+
+    def toJSON(self):
+        data = {"offset": self.offset, "opcode": self.opcode, "name": self.name, "size": self.size}
+        if self.depth:
+            data["depth"] = self.depth
+        data["fields"] = self.fields
+        if self.lines:
+            data["lines"] = self.lines
+        return json.dumps(data, default=toJSONValue)
+
+
+class RepeatedField(list):
+    """The values of a field that was set more than once in a record."""
+
+
+def toJSONValue(value):
+    """Convert values that json doesn't know about."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+class Writer:
+    """Collects the fields of the open records and writes each record as a
+    line to fd, a text file.  A record that gets a nested record is written
+    before it, so that the lines stay in stream order."""
+    def __init__(self, fd):
+        self.fd = fd
+        self.records = []
+        self.implicit = None
+
+    def beginRecord(self, offset, opcode, name, size):
+        self.__endImplicit()
+        if len(self.records) > 0:
+            self.__write(self.records[-1])
+        self.records.append(Record(offset, opcode, name, size, len(self.records)))
+
+    def endRecord(self):
+        self.__endImplicit()
+        self.__write(self.records.pop())
+
+    def __write(self, record):
+        if not record.written:
+            self.fd.write(record.toJSON() + "\n")
+            record.written = True
+
+    def __endImplicit(self):
+        if self.implicit is not None:
+            self.__write(self.implicit)
+            self.implicit = None
+
+    def __current(self, owner):
+        if len(self.records) > 0:
+            return self.records[-1]
+        if self.implicit is None or self.implicit.owner is not owner:
+            self.__endImplicit()
+            self.implicit = Record(None, None, type(owner).__name__, None, 0, owner)
+        return self.implicit
+
+    def setField(self, owner, key, value, name=None):
+        """Add a field to the current record, or to the record of owner when
+        no record is open.  A field set more than once becomes a list."""
+        fields = self.__current(owner).fields
+        if name is not None:
+            value = {"value": value, "name": name}
+        if key not in fields:
+            fields[key] = value
+        elif isinstance(fields[key], RepeatedField):
+            fields[key].append(value)
+        else:
+            fields[key] = RepeatedField([fields[key], value])
+
+    def addLine(self, owner, line):
+        """Add a line of a record handler: 'key: value' lines become fields,
+        others are kept in the lines of the record."""
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        key, sep, value = line.partition(": ")
+        if sep and key and len(key) < 64:
+            self.setField(owner, key.strip(), value)
+        else:
+            self.__current(owner).lines.append(line)
+
+    def close(self):
+        while len(self.records) > 0:
+            self.endRecord()
+        self.__endImplicit()
+
+# vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
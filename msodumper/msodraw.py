@@ -5,12 +5,14 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 from builtins import range
-from . import globals, xlsmodel
+from . import globals
 import sys
 import textwrap
 import zlib
 import base64
-from .pptrecord import shapeTypes
+
+xlsmodel = globals.LazyModule('xlsmodel')
+pptrecord = globals.LazyModule('pptrecord')
 
 def indent (level):
     return '  '*level
@@ -121,7 +123,7 @@ class RecordHeader:
         shapeType = ""
         if self.recType == RecordHeader.Type.FSP:
             # In this case recInstance is from the MSOSPT enumeration
-            shapeType = ' msospt="%s"' % shapeTypes[self.recInstance][0]
+            shapeType = ' msospt="%s"' % pptrecord.shapeTypes[self.recInstance][0]
         recHdl.appendLine('<recInstance value="0x%1.1X"%s/>' % (self.recInstance, shapeType))
         recHdl.appendLine('<recType value="0x%1.1X"/>' % self.recType)
         recHdl.appendLine('<recLen value="0x%1.1X"/>' % self.recLen)
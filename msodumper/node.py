@@ -22,16 +22,26 @@ class NodeType:
     # node that only has textural content.
     Content = 3
 
-class NodeBase:
+# Child list of the nodes that have no children yet, shared to save memory.
+noChildNodes = ()
+
+class NodeBase(object):
+    # Dumps of big documents create millions of nodes: no per-instance
+    # __dict__.
+    __slots__ = ('parent', 'nodeType', '__children', '__hasContent')
+
     def __init__ (self, nodeType = NodeType.Unknown):
         self.parent = None
         self.nodeType = nodeType
 
-        self.__children = []
+        self.__children = noChildNodes
         self.__hasContent = False
 
     def appendChild (self, node):
-        self.__children.append(node)
+        if self.__children is noChildNodes:
+            self.__children = [node]
+        else:
+            self.__children.append(node)
         node.parent = self
 
     def appendElement (self, name):
@@ -71,21 +81,46 @@ class NodeBase:
         return children
 
 class Root(NodeBase):
+    __slots__ = ()
+
     def __init__ (self):
         NodeBase.__init__(self, NodeType.Root)
 
 class Content(NodeBase):
+    __slots__ = ('content',)
+
     def __init__ (self, content):
         NodeBase.__init__(self, NodeType.Content)
         self.content = content
 
 class Element(NodeBase):
+    # Attributes are kept as a flat (name, value, name, value...) tuple,
+    # which is a lot smaller than a dict for the few attributes elements
+    # have.
+    __slots__ = ('name', '__attrs')
+
     def __init__ (self, name, attrs=None):
         NodeBase.__init__(self, NodeType.Element)
         self.name = name
-        self.attrs = attrs
-        if self.attrs == None:
-            self.attrs = {}
+        self.__attrs = ()
+        if attrs != None:
+            self.attrs = attrs
+
+    @property
+    def attrs (self):
+        """The attributes as a new dict, see also getAttrItems()."""
+        return dict(self.getAttrItems())
+
+    @attrs.setter
+    def attrs (self, attrs):
+        self.__attrs = ()
+        for name in attrs.keys():
+            self.setAttr(name, attrs[name])
+
+    def getAttrItems (self):
+        """Return the (name, value) pairs of the attributes."""
+        attrs = self.__attrs
+        return list(zip(attrs[0::2], attrs[1::2]))
 
     def getContent (self):
         text = ''
@@ -101,16 +136,28 @@ class Element(NodeBase):
                 text += child.getContent()
         return text
 
+    def __findAttr (self, name):
+        attrs = self.__attrs
+        for i in range(0, len(attrs), 2):
+            if attrs[i] == name:
+                return i
+        return -1
+
     def getAttr (self, name):
-        if not name in self.attrs:
+        i = self.__findAttr(name)
+        if i < 0:
             return None
-        return self.attrs[name]
+        return self.__attrs[i+1]
 
     def setAttr (self, name, val):
-        self.attrs[name] = val
+        i = self.__findAttr(name)
+        if i < 0:
+            self.__attrs += (name, val)
+        else:
+            self.__attrs = self.__attrs[:i+1] + (val,) + self.__attrs[i+2:]
 
     def hasAttr (self, name):
-        return name in self.attrs
+        return self.__findAttr(name) >= 0
 
 encodeTable = {
     b'>': b'gt',
@@ -120,37 +167,54 @@ encodeTable = {
     b'\'': b'apos'
 }
 
+def makeEncodeTables ():
+    """Build the str.translate() tables of encodeString(), which work on the
+input bytes decoded as latin-1, so that each byte is one character."""
+    utf8Table = {0: u'(nullbyte)'}
+    hexTable = {0: u'\\x00'}
+    for i in range(128, 256):
+        hexTable[i] = u'\\x%2.2x'%i
+    for c, name in encodeTable.items():
+        entity = u'&' + name.decode('ascii') + u';'
+        utf8Table[ord(c)] = entity
+        hexTable[ord(c)] = entity
+    return utf8Table, hexTable
+
+utf8EncodeTable, hexEncodeTable = makeEncodeTables()
+
+# Encoded values of encodeString(), by (input, utf8): attribute values tend
+# to repeat a lot.
+encodeCache = {}
+encodeCacheSize = 65536
+
 # If utf8 is set, the input is either utf-8 bytes or Python
 # Unicode. Output utf-8 instead of hex-dump.
 def encodeString (sin, utf8 = False):
-    sout = b''
-    if type(sin) == type(u""):
-        sin = sin.encode('UTF-8')
+    key = (sin, utf8)
+    try:
+        return encodeCache[key]
+    except (KeyError, TypeError):
+        pass
+
+    raw = sin
+    if type(raw) == type(u""):
+        raw = raw.encode('UTF-8')
     if utf8:
         # Escape special characters as entities. Can't keep zero bytes either
         # (bad XML). They can only arrive here if there is a bug somewhere.
-        for c in sin:
-            cc = globals.indexedbytetobyte(c)
-            if c == b'\0'[0]:
-                sout += b'(nullbyte)'
-            elif cc in encodeTable:
-                sout += b'&' + encodeTable[cc] + b';'
-            else:
-                sout += cc
+        sout = raw.decode('latin-1').translate(utf8EncodeTable).encode('latin-1').decode('UTF-8')
     else:
-        for c in sin:
-            ic = globals.indexedbytetoint(c)
-            cc = globals.indexedbytetobyte(c)
-            if ic >= 128 or ic == 0:
-                # encode non-ascii ranges.
-                sout += b"\\x%2.2x"%ic
-            elif cc in encodeTable:
-                # encode html symbols.
-                sout += b'&' + encodeTable[cc] + b';'
-            else:
-                sout += cc
-
-    return sout.decode('UTF-8')
+        # encode non-ascii ranges and html symbols.
+        sout = raw.decode('latin-1').translate(hexEncodeTable)
+
+    try:
+        if len(encodeCache) >= encodeCacheSize:
+            encodeCache.clear()
+        encodeCache[key] = sout
+    except TypeError:
+        # unhashable input, e.g. a bytearray
+        pass
+    return sout
 
 if globals.PY3:
     def isintegertype(val):
@@ -172,6 +236,21 @@ def convertAttrValue (val):
 
     return val
 
+def formatStartTag (name, attrs, utf8 = False):
+    """Return the element name with its attributes, without the brackets.
+attrs is a dict or a list of (name, value) pairs."""
+    if attrs == None or len(attrs) == 0:
+        return name
+    if isinstance(attrs, dict):
+        attrs = attrs.items()
+    parts = [name]
+    for key, val in sorted(attrs, key=lambda item: item[0]):
+        if val == None:
+            continue
+        val = convertAttrValue(val)
+        parts.append(' %s="%s"'%(key, encodeString(val, utf8 = utf8)))
+    return "".join(parts)
+
 # If utf8 is set, the input is either utf-8 bytes or unicode
 def prettyPrint (fd, node, utf8 = False):
     printNode(fd, node, 0, True, utf8 = utf8)
@@ -192,15 +271,7 @@ def printNode (fd, node, level, breakLine, utf8 = False):
 
         # We add '<' and '>' (or '/>') after the element content gets
         # encoded.
-        line = node.name
-        if len(node.attrs) > 0:
-            keys = sorted(node.attrs.keys())
-            for key in keys:
-                val = node.attrs[key]
-                if val == None:
-                    continue
-                val = convertAttrValue(val)
-                line += " " + key + '="' + encodeString(val, utf8 = utf8) + '"'
+        line = formatStartTag(node.name, node.getAttrItems(), utf8 = utf8)
 
         if hasChildren:
             breakChildren = breakLine and not node.hasContent()
@@ -224,4 +295,58 @@ def printNode (fd, node, level, breakLine, utf8 = False):
         if len(content) > 0:
             fd.write (indent + content + lf)
 
+class XMLWriter(object):
+    """Writes XML as its elements are produced, in the same format as
+prettyPrint(), so that a document doesn't have to be built as a whole tree
+first.
+
+Elements are opened and closed with startElement() and endElement(), and
+complete subtrees are written with appendNode().  The start tag of an
+element is held back until it's known whether the element has children.
+Output is passed to fd in blocks of at most bufferSize fragments."""
+
+    def __init__ (self, fd, utf8 = False, bufferSize = 4096):
+        self.fd = fd
+        self.utf8 = utf8
+        self.bufferSize = bufferSize
+        self.buffer = []
+        self.stack = []  # [name, start tag, has children] of open elements
+
+    def write (self, text):
+        self.buffer.append(text)
+        if len(self.buffer) >= self.bufferSize:
+            self.flush()
+
+    def flush (self):
+        if len(self.buffer) > 0:
+            self.fd.write("".join(self.buffer))
+            self.buffer = []
+
+    def __openParent (self):
+        if len(self.stack) == 0 or self.stack[-1][2]:
+            return
+        self.write(' '*4*(len(self.stack)-1) + "<%s>\n"%self.stack[-1][1])
+        self.stack[-1][2] = True
+
+    def startElement (self, name, attrs = None):
+        self.__openParent()
+        self.stack.append([name, formatStartTag(name, attrs, utf8 = self.utf8), False])
+
+    def endElement (self):
+        name, line, hasChildren = self.stack.pop()
+        indent = ' '*4*len(self.stack)
+        if hasChildren:
+            self.write("%s</%s>\n"%(indent, name))
+        else:
+            self.write("%s<%s/>\n"%(indent, line))
+
+    def appendNode (self, node):
+        self.__openParent()
+        printNode(self, node, len(self.stack), True, utf8 = self.utf8)
+
+    def close (self):
+        while len(self.stack) > 0:
+            self.endElement()
+        self.flush()
+
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
@@ -5,8 +5,8 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 from builtins import range
-import sys
-from . import globals
+import sys, os, mmap, struct, array, collections
+from . import globals, hexdump
 from .globals import getSignedInt, output
 # ----------------------------------------------------------------------------
 # Reference: The Microsoft Compound Document File Format by Daniel Rentz
@@ -16,6 +16,203 @@ from .globals import getSignedInt, output
 
 class NoRootStorage(Exception): pass
 
+# Input that can't seek, such as a pipe, is kept in memory up to this many
+# bytes, and spilled into a temporary file beyond that.
+SpoolMemorySize = 16*1024*1024
+SpoolChunkSize = 64*1024
+
+def openFile (filePath):
+    """Open a compound document file for reading.  filePath is either a path,
+'-' for the standard input, or a binary file object that is open already."""
+    if filePath == '-':
+        return getattr(sys.stdin, 'buffer', sys.stdin)
+    if hasattr(filePath, 'read'):
+        return filePath
+    return open(filePath, 'rb')
+
+def isSeekable (file):
+    try:
+        return file.seekable()
+    except AttributeError:
+        return hasattr(file, 'seek')
+
+def spoolFile (file):
+    """Read a file object that can't seek up to its end.  Return bytes if
+the content fits into SpoolMemorySize, or else a memoryview of the temporary
+file it was spilled into, mapped into memory."""
+
+    pieces = []
+    size = 0
+    while size <= SpoolMemorySize:
+        chunk = file.read(SpoolChunkSize)
+        if not chunk:
+            return b"".join(pieces)
+        pieces.append(chunk)
+        size += len(chunk)
+
+    import tempfile, shutil
+    spill = tempfile.TemporaryFile()
+    try:
+        for piece in pieces:
+            spill.write(piece)
+        pieces = None
+        shutil.copyfileobj(file, spill, SpoolChunkSize)
+        spill.flush()
+        # the mapping stays valid after the file is closed.
+        return memoryview(mmap.mmap(spill.fileno(), 0, access=mmap.ACCESS_READ))
+    finally:
+        spill.close()
+
+def readFile (filePath, useMmap=False):
+    """Return the content of a compound document file.
+
+When useMmap is True, the file is mapped into memory and a read-only
+memoryview over the mapping is returned instead of a bytes object.  Header,
+MSAT, SAT and Directory only slice into their input, so with a mapped file
+only the pages that actually get touched are read from disk.
+
+filePath can also be '-' or a file object, see openFile().  Input that can't
+seek, such as a pipe, is read through spoolFile()."""
+
+    file = openFile(filePath)
+    try:
+        if not isSeekable(file):
+            return spoolFile(file)
+        if useMmap:
+            try:
+                return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            except (ValueError, AttributeError):
+                # empty files can't be mapped, and file objects like tar
+                # members have no file descriptor.
+                pass
+        return file.read()
+    finally:
+        if file is not filePath and filePath != '-':
+            file.close()
+
+class FileBytes(object):
+    """Read-only, bytes-like access to a seekable file.
+
+Only the ranges that get sliced are read from the file, so a compound document
+can be inspected without reading it as a whole.  Slicing returns bytes and
+indexing returns an integer, like bytes do in Python 3.  bytesRead counts the
+bytes read from the file so far.  close() closes the file only if owned is
+True, so that files passed in by the caller stay open.
+"""
+    def __init__ (self, file, owned=True):
+        self.file = file
+        self.owned = owned
+        file.seek(0, 2)
+        self.size = file.tell()
+        self.bytesRead = 0
+
+    def __len__ (self):
+        return self.size
+
+    def __getitem__ (self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step != 1:
+                return self[start:stop][::step]
+            if stop <= start:
+                return b""
+            self.file.seek(start)
+            bytes = self.file.read(stop - start)
+            self.bytesRead += len(bytes)
+            return bytes
+
+        if key < 0:
+            key += self.size
+        if key < 0 or key >= self.size:
+            raise IndexError("file index out of range")
+        return globals.indexbytes(self[key:key+1], 0)
+
+    def __bytes__ (self):
+        return self[0:self.size]
+
+    def close (self):
+        if self.owned:
+            self.file.close()
+
+class SpooledBytes(FileBytes):
+    """FileBytes for a file object that can't seek, such as a pipe.
+
+The input is only read as far as the requested slices need it, into a
+temporary file that is kept in memory up to SpoolMemorySize bytes.  close()
+always closes the temporary file, and the input only if owned is True.
+"""
+    def __init__ (self, source, owned=True):
+        self.source = source
+        self.sourceOwned = owned
+        self.complete = False
+        import tempfile
+        FileBytes.__init__(self, tempfile.SpooledTemporaryFile(max_size=SpoolMemorySize))
+
+    def __spool (self, end=None):
+        # read the input up to end, or up to its end if end is None.
+        while not self.complete and (end == None or self.size < end):
+            chunk = self.source.read(SpoolChunkSize)
+            if not chunk:
+                self.complete = True
+                break
+            self.file.seek(self.size)
+            self.file.write(chunk)
+            self.size += len(chunk)
+
+    def __len__ (self):
+        self.__spool()
+        return self.size
+
+    def __getitem__ (self, key):
+        if isinstance(key, slice):
+            start = key.start or 0
+            if key.step == None and start >= 0 and key.stop != None and key.stop >= 0:
+                self.__spool(key.stop)
+            else:
+                self.__spool()
+        elif key >= 0:
+            self.__spool(key + 1)
+        else:
+            self.__spool()
+        return FileBytes.__getitem__(self, key)
+
+    def __bytes__ (self):
+        self.__spool()
+        return FileBytes.__bytes__(self)
+
+    def close (self):
+        FileBytes.close(self)
+        if self.sourceOwned:
+            self.source.close()
+
+def scanFile (filePath, params):
+    """Parse the header and the directory entries of a compound document file.
+
+Only the header, the MSAT sectors, the SAT sectors that the directory chain
+passes through and the directory sectors themselves are read; stream contents
+are read from the file only when they are actually requested.  filePath can
+also be '-' or a file object, see openFile(); input that can't seek is read
+only as far as the directory.  Return the Header; its getDirectory() has the
+entries parsed.  The file stays open for reading the streams, call close() on
+the Header when done with it.  A file object passed in is left open."""
+
+    file = openFile(filePath)
+    owned = file is not filePath and filePath != '-'
+    if isSeekable(file):
+        bytes = FileBytes(file, owned)
+    else:
+        bytes = SpooledBytes(file, owned)
+    header = Header(bytes, params)
+    try:
+        header.parse()
+        directory = header.getDirectory(scan=True)
+        if directory != None:
+            directory.parseDirEntries()
+    except:
+        bytes.close()
+        raise
+    return header
+
 class ByteOrder:
     LittleEndian = 0
     BigEndian    = 1
@@ -47,6 +244,8 @@ class Header(object):
     def __init__ (self, bytes, params):
         self.bytes = bytes
         self.MSAT = None
+        self.__SSAT = None
+        self.__directory = None
 
         self.docId = None
         self.uId = None
@@ -71,6 +270,11 @@ class Header(object):
     def getSectorSize (self):
         return 2**self.secSize
 
+    def close (self):
+        """Close the file that scanFile() opened, if any."""
+        if isinstance(self.bytes, FileBytes):
+            self.bytes.close()
+
 
     def getShortSectorSize (self):
         return 2**self.secSizeShort
@@ -88,16 +292,11 @@ class Header(object):
 
     def output (self):
 
-        if globals.PY3:
-            def printRawBytes (bytes):
-                for b in bytes:
-                    output("%2.2X "%b)
-                output("\n")
-        else:
-            def printRawBytes (bytes):
-                for b in bytes:
-                    output("%2.2X "%ord(b))
-                output("\n")
+        def printRawBytes (bytes):
+            text = hexdump.formatHex(bytes)
+            if len(text) > 0:
+                text += " "
+            output(text + "\n")
 
         def printSep (c, w, prefix=''):
             globals.outputln(prefix + c*w)
@@ -195,13 +394,10 @@ class Header(object):
 
         # First part of MSAT consisting of an array of up to 109 sector IDs.
         # Each sector ID is 4 bytes in length.
-        for i in range(0, 109):
-            pos = 76 + i*4
-            id = getSignedInt(self.bytes[pos:pos+4])
-            if id == -1:
-                break
-
-            self.MSAT.appendSectorID(id)
+        ids = getSectorIDArray(self.bytes[76:512])
+        if -1 in ids:
+            ids = ids[:ids.index(-1)]
+        self.MSAT.appendSectorIDs(ids)
 
         if self.__secIDFirstMSAT != -2:
             # additional sectors are used to store more SAT sector IDs.
@@ -209,23 +405,23 @@ class Header(object):
             size = self.getSectorSize()
             if size < 4:
                 raise Exception("ole.Header::parse: got %d as sector size!" % size)
-            inLoop = True
-            while inLoop:
+            visited = set()
+            while secID >= 0 and secID not in visited:
+                visited.add(secID)
                 pos = 512 + secID*size
-                bytes = self.bytes[pos:pos+size]
-                n = int(size/4)
-                for i in range(0, n):
-                    pos = i*4
-                    id = getSignedInt(bytes[pos:pos+4])
-                    if id < 0:
-                        inLoop = False
-                        break
-                    elif i == n-1:
-                        # last sector ID - points to the next MSAT sector.
-                        secID = id
+                ids = getSectorIDArray(self.bytes[pos:pos+size])
+                if len(ids) < size//4:
+                    # MSAT sector is outside of the file.
+                    break
+                self.MSAT.ownSectorIDs.append(secID)
+                # The last sector ID points to the next MSAT sector.
+                secID = ids.pop()
+                for i in range(0, len(ids)):
+                    if ids[i] < 0:
+                        ids = ids[:i]
+                        secID = -2
                         break
-                    else:
-                        self.MSAT.appendSectorID(id)
+                self.MSAT.appendSectorIDs(ids)
 
         return 512
 
@@ -239,6 +435,9 @@ class Header(object):
 
 
     def getSSAT (self):
+        if self.__SSAT != None:
+            return self.__SSAT
+
         ssatID = self.getFirstSectorID(BlockType.SSAT)
         if ssatID < 0:
             return None
@@ -249,20 +448,34 @@ class Header(object):
         for secID in chain:
             obj.addSector(secID)
         obj.buildArray()
-        return obj
+        self.__SSAT = obj
+        return self.__SSAT
+
 
+    def getDirectory (self, scan=False):
+        """Return the directory of this document.
+
+The directory is built once and then shared by all callers, so that its
+parsed entries, root storage bytes and sector chains are only computed once.
+With scan, the directory sector chain is followed through the MSAT, reading
+only the SAT sectors it passes through instead of building the whole SAT."""
+        if self.__directory != None:
+            return self.__directory
 
-    def getDirectory (self):
         dirID = self.getFirstSectorID(BlockType.Directory)
         if dirID < 0:
             return None
-        chain = self.getSAT().getSectorIDChain(dirID)
+        if scan:
+            chain = self.MSAT.getSectorIDChain(dirID)
+        else:
+            chain = self.getSAT().getSectorIDChain(dirID)
         if len(chain) == 0:
             return None
         obj = Directory(self, self.params)
         for secID in chain:
             obj.addSector(secID)
-        return obj
+        self.__directory = obj
+        return self.__directory
 
 
     def dummy ():
@@ -282,14 +495,21 @@ all the sectors pointed by the sector IDs in order of occurrence.
     def __init__ (self, sectorSize, bytes, params):
         self.sectorSize = sectorSize
         self.secIDs = []
+        # IDs of the sectors that store the MSAT beyond the header.
+        self.ownSectorIDs = []
         self.bytes = bytes
         self.__SAT = None
+        # SAT sectors read by getNextSectorID(), keyed by their MSAT index.
+        self.__SATSectors = {}
 
         self.params = params
 
     def appendSectorID (self, id):
         self.secIDs.append(id)
 
+    def appendSectorIDs (self, ids):
+        self.secIDs.extend(ids)
+
     def output (self):
         globals.outputln('')
         globals.outputln("="*globals.OutputWidth)
@@ -315,11 +535,48 @@ all the sectors pointed by the sector IDs in order of occurrence.
             obj.addSector(id)
         obj.buildArray()
         self.__SAT = obj
+        self.__SATSectors = {}
         return self.__SAT
 
+    def getNextSectorID (self, secID):
+        """Return the SAT entry of a sector, reading only the one SAT sector
+that holds it unless the whole SAT has been built already."""
+        if self.__SAT != None:
+            if secID >= len(self.__SAT.array):
+                return -2
+            return self.__SAT.array[secID]
+
+        index, pos = divmod(secID, self.sectorSize//4)
+        if index >= len(self.secIDs):
+            # the sector is not covered by the SAT.
+            return -2
+        if index not in self.__SATSectors:
+            satPos = 512 + self.secIDs[index]*self.sectorSize
+            self.__SATSectors[index] = getSectorIDArray(self.bytes[satPos:satPos+self.sectorSize])
+        ids = self.__SATSectors[index]
+        if pos >= len(ids):
+            # the SAT sector is outside of the file.
+            return -2
+        return ids[pos]
+
+    def getSectorIDChain (self, initID):
+        """Same as SAT.getSectorIDChain(), but without building the SAT."""
+        chain = []
+        visited = set()
+        secID = initID
+        while secID >= 0 and secID not in visited:
+            # Beware of infinite loop: happens on bad files.
+            visited.add(secID)
+            chain.append(secID)
+            secID = self.getNextSectorID(secID)
+        return chain
+
 
 class SAT(object):
     """Sector Allocation Table (SAT)
+
+The table is built in bulk into an array of 4-byte sector IDs, which also
+serves as the "next sector" table that all getSectorIDChain() calls walk.
 """
     def __init__ (self, sectorSize, bytes, params):
         self.sectorSize = sectorSize
@@ -327,6 +584,10 @@ class SAT(object):
         self.bytes = bytes
         self.array = []
         self.params = params
+        # Generation stamps of the last chain walk that visited each sector,
+        # used to detect cycles in the chains.
+        self.__visited = None
+        self.__generation = 0
 
 
     def getSectorSize (self):
@@ -342,22 +603,26 @@ class SAT(object):
             # array already built.
             return
 
-        numItems = int(self.sectorSize/4)
-        self.array = []
+        pieces = []
         for secID in self.sectorIDs:
             pos = 512 + secID*self.sectorSize
-            for i in range(0, numItems):
-                beginPos = pos + i*4
-                id = getSignedInt(self.bytes[beginPos:beginPos+4])
-                self.array.append(id)
+            piece = self.bytes[pos:pos+self.sectorSize]
+            if len(piece) < self.sectorSize:
+                # sector is (partially) outside of the file: the missing
+                # entries end their chains, like getNextSectorID() does.
+                complete = len(piece)//4*4
+                piece = bytes(piece[0:complete]) + EndOfChainBytes*((self.sectorSize - complete)//4)
+            pieces.append(piece)
+        self.array = getSectorIDArray(b"".join(pieces))
+        self.__visited = None
 
 
     def outputRawBytes (self):
-        bytes = b""
+        pieces = []
         for secID in self.sectorIDs:
             pos = 512 + secID*self.sectorSize
-            bytes += self.bytes[pos:pos+self.sectorSize]
-        globals.dumpBytes(bytes, 512)
+            pieces.append(self.bytes[pos:pos+self.sectorSize])
+        globals.dumpBytes(b"".join(pieces), 512)
 
 
     def outputArrayStats (self):
@@ -413,14 +678,26 @@ class SAT(object):
     def getSectorIDChain (self, initID):
         if initID < 0:
             return []
+
+        if self.__visited == None or len(self.__visited) != len(self.array):
+            self.__visited = array.array('i', [0])*len(self.array)
+            self.__generation = 0
+        self.__generation += 1
+        generation = self.__generation
+        visited = self.__visited
+        table = self.array
+
         chain = [initID]
-        nextID = self.array[initID]
+        visited[initID] = generation
+        nextID = table[initID]
         while nextID != -2:
             chain.append(nextID)
-            if nextID == self.array[nextID]:
+            visited[nextID] = generation
+            followID = table[nextID]
+            if followID == nextID or (followID >= 0 and visited[followID] == generation):
                 # Beware of infinite loop: happens on bad files.
                 break
-            nextID = self.array[nextID]
+            nextID = followID
         return chain
 
 
@@ -451,6 +728,146 @@ sectors are contained in the SAT as a sector ID chain.
         self.outputArrayStats()
 
 
+# Typecode of a signed 4-byte array item, 'i' on all common ABIs.
+SectorIDTypecode = [code for code in 'il' if array.array(code).itemsize == 4][0]
+
+# A sector ID of -2 (end of chain), as stored in the file.
+EndOfChainBytes = struct.pack('<i', -2)
+
+def getSectorIDArray (bytes):
+    """Convert little endian 4-byte sector IDs into an array in one go."""
+    ids = array.array(SectorIDTypecode)
+    ids.frombytes(bytes[0:len(bytes)//4*4])
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    return ids
+
+
+class SectorChainView(object):
+    """Read-only view of a stream that is stored as a chain of sectors.
+
+Logical offsets within the stream are mapped onto the sectors of the chain on
+demand, so the stream never has to be concatenated into one bytes object.  It
+supports len(), indexing (which returns an integer, as bytes do in Python 3)
+and slicing (which returns bytes), so that the stream classes can consume it
+in place of bytes.  Views can be nested: short streams are views over the view
+of the root storage stream.
+"""
+    def __init__ (self, bytes, chain, sectorSize, offset=0):
+        self.bytes = bytes
+        self.chain = chain
+        self.sectorSize = sectorSize
+        self.offset = offset
+        self.size = len(chain)*sectorSize
+
+    @staticmethod
+    def create (bytes, chain, sectorSize, offset=0):
+        """Return a view, or None if some sectors of the chain are not fully
+available in the underlying bytes (bad or truncated file)."""
+        end = len(bytes) - sectorSize
+        for secID in chain:
+            pos = offset + secID*sectorSize
+            if pos < 0 or pos > end:
+                return None
+        return SectorChainView(bytes, chain, sectorSize, offset)
+
+    def __len__ (self):
+        return self.size
+
+    def getRanges (self, start, stop):
+        """Return the list of (position, length) pairs in the underlying bytes
+that make up the logical range [start, stop).  Adjacent sectors are merged
+into a single range."""
+        ranges = []
+        secSize = self.sectorSize
+        pos = start
+        while pos < stop:
+            index, secOffset = divmod(pos, secSize)
+            begin = self.offset + self.chain[index]*secSize + secOffset
+            length = min(secSize - secOffset, stop - pos)
+            if len(ranges) > 0 and ranges[-1][0] + ranges[-1][1] == begin:
+                ranges[-1][1] += length
+            else:
+                ranges.append([begin, length])
+            pos += length
+        return ranges
+
+    def getBase (self):
+        """Return the bytes that the innermost view is over."""
+        if isinstance(self.bytes, SectorChainView):
+            return self.bytes.getBase()
+        return self.bytes
+
+    def getBaseRanges (self, start, stop):
+        """Same as getRanges(), but the ranges of nested views are resolved
+down to the bytes that the innermost view is over."""
+        ranges = self.getRanges(start, stop)
+        if not isinstance(self.bytes, SectorChainView):
+            return ranges
+        baseRanges = []
+        for pos, length in ranges:
+            for begin, size in self.bytes.getBaseRanges(pos, pos + length):
+                if len(baseRanges) > 0 and baseRanges[-1][0] + baseRanges[-1][1] == begin:
+                    baseRanges[-1][1] += size
+                else:
+                    baseRanges.append([begin, size])
+        return baseRanges
+
+    def __getitem__ (self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step != 1:
+                return self.tobytes()[key]
+            pieces = [self.bytes[pos:pos+length] for pos, length in self.getRanges(start, stop)]
+            if len(pieces) == 1 and type(pieces[0]) == type(b''):
+                return pieces[0]
+            return b"".join(pieces)
+
+        if key < 0:
+            key += self.size
+        if key < 0 or key >= self.size:
+            raise IndexError("sector chain index out of range")
+        index, secOffset = divmod(key, self.sectorSize)
+        return self.bytes[self.offset + self.chain[index]*self.sectorSize + secOffset]
+
+    def __iter__ (self):
+        for pos, length in self.getRanges(0, self.size):
+            for byte in self.bytes[pos:pos+length]:
+                yield byte
+
+    def unpack_from (self, fmt, offset=0):
+        """Same as struct.unpack_from(fmt, stream, offset); fmt is either a
+format string or a struct.Struct."""
+        if isinstance(fmt, struct.Struct):
+            size = fmt.size
+        else:
+            size = struct.calcsize(fmt)
+            fmt = struct.Struct(fmt)
+        if offset < 0 or offset + size > self.size:
+            raise struct.error("unpack_from requires a buffer of at least %d bytes" % (offset + size))
+        ranges = self.getRanges(offset, offset + size)
+        if len(ranges) == 1 and not isinstance(self.bytes, (SectorChainView, FileBytes)):
+            return fmt.unpack_from(self.bytes, ranges[0][0])
+        return fmt.unpack(self[offset:offset+size])
+
+    def readinto (self, buf, offset=0):
+        """Copy the stream content starting at offset into the writable
+buffer buf.  Return the number of bytes copied."""
+        target = memoryview(buf)
+        stop = min(self.size, offset + len(target))
+        copied = 0
+        for pos, length in self.getRanges(offset, stop):
+            target[copied:copied+length] = self.bytes[pos:pos+length]
+            copied += length
+        return copied
+
+    def tobytes (self):
+        return self[:]
+
+    def __bytes__ (self):
+        return self.tobytes()
+
+
 class Directory(object):
     """Directory Entries
 
@@ -498,12 +915,46 @@ entire file stream.
         self.minStreamSize = header.minStreamSize
         self.sectorIDs = []
         self.entries = []
-        self.SAT = header.getSAT()
-        self.SSAT = header.getSSAT()
         self.header = header
         self.RootStorage = None
-        self.RootStorageBytes = b""
+        self.RootStorageBytes = None
         self.params = params
+        # sector chains of the stream entries, keyed by location and first
+        # sector ID.
+        self.__chains = {}
+
+
+    @property
+    def SAT (self):
+        # built on first use, a directory scan doesn't need it.
+        return self.header.getSAT()
+
+    @property
+    def SSAT (self):
+        return self.header.getSSAT()
+
+    def getStreamSectorIDChain (self, entry):
+        key = (entry.StreamLocation, entry.StreamSectorID)
+        if key not in self.__chains:
+            if entry.StreamLocation == StreamLocation.SSAT:
+                satObj = self.SSAT
+            else:
+                satObj = self.SAT
+            self.__chains[key] = satObj.getSectorIDChain(entry.StreamSectorID)
+        return self.__chains[key]
+
+
+    def __getChainBytes (self, bytes, chain, size, offset):
+        view = SectorChainView.create(bytes, chain, size, offset)
+        if view != None:
+            return view
+
+        # Some sectors lie outside of the file; take whatever is there.
+        pieces = []
+        for id in chain:
+            pos = offset + id*size
+            pieces.append(bytes[pos:pos+size])
+        return b"".join(pieces)
 
 
     def __buildRootStorageBytes (self):
@@ -511,47 +962,50 @@ entire file stream.
             # no root storage exists.
             return
 
+        if self.RootStorageBytes != None:
+            # root storage bytes already built.
+            return
+
         firstSecID = self.RootStorage.StreamSectorID
         chain = self.header.getSAT().getSectorIDChain(firstSecID)
-        for secID in chain:
-            pos = 512 + secID*self.sectorSize
-            self.RootStorageBytes += self.header.bytes[pos:pos+self.sectorSize]
+        self.RootStorageBytes = self.__getChainBytes(self.header.bytes, chain, self.sectorSize, 512)
 
 
     def __getRawStream (self, entry):
-        chain = []
-        if entry.StreamLocation == StreamLocation.SAT:
-            chain = self.header.getSAT().getSectorIDChain(entry.StreamSectorID)
-        elif entry.StreamLocation == StreamLocation.SSAT:
-            chain = self.header.getSSAT().getSectorIDChain(entry.StreamSectorID)
+        chain = self.getStreamSectorIDChain(entry)
 
         if entry.StreamLocation == StreamLocation.SSAT:
             # Get the root storage stream.
             if self.RootStorage == None:
                 raise NoRootStorage
 
-            bytes = b""
             self.__buildRootStorageBytes()
             size = self.header.getShortSectorSize()
-            for id in chain:
-                pos = id*size
-                bytes += self.RootStorageBytes[pos:pos+size]
-            return bytes
+            return self.__getChainBytes(self.RootStorageBytes, chain, size, 0)
 
-        offset = 512
         size = self.header.getSectorSize()
-        bytes = b""
-        for id in chain:
-            pos = offset + id*size
-            bytes += self.header.bytes[pos:pos+size]
-
-        return bytes
+        return self.__getChainBytes(self.header.bytes, chain, size, 512)
 
     def getRawStream (self, entry):
         bytes = self.__getRawStream(entry)
+        if isinstance(bytes, SectorChainView):
+            bytes = bytes.tobytes()
         return bytes
 
     def getRawStreamByName (self, name):
+        bytes = b''
+        for entry in self.entries:
+            if entry.Name == name:
+                bytes = self.getRawStream(entry)
+                break
+        return bytes
+
+    def getStreamView (self, entry):
+        """Same as getRawStream(), but returns a SectorChainView instead of
+concatenating the sectors of the stream whenever possible."""
+        return self.__getRawStream(entry)
+
+    def getStreamViewByName (self, name):
         bytes = b''
         for entry in self.entries:
             if entry.Name == name:
@@ -654,7 +1108,7 @@ entire file stream.
                 satObj = self.SSAT
                 secSize = self.header.getShortSectorSize()
             if satObj != None:
-                chain = satObj.getSectorIDChain(entry.StreamSectorID)
+                chain = self.getStreamSectorIDChain(entry)
                 globals.outputln("sector count: %d"%len(chain))
                 globals.outputln("total sector size: %d"%(len(chain)*secSize))
                 if self.params.showSectorChain:
@@ -685,15 +1139,10 @@ entire file stream.
         if bytes == None:
             return
 
-        output("%s: "%name)
-        if globals.PY3:
-            for byte in bytes:
-                output("%2.2X "%byte)
-        else:
-            for byte in bytes:
-                output("%2.2X "%ord(byte))
-
-        globals.outputln("")
+        text = hexdump.formatHex(bytes)
+        if len(text) > 0:
+            text += " "
+        globals.outputln("%s: %s"%(name, text))
 
     def getDirectoryEntries (self):
         return self.entries
@@ -711,10 +1160,11 @@ entire file stream.
             return
 
         # combine all sectors first.
-        bytes = b""
+        pieces = []
         for secID in self.sectorIDs:
             pos = globals.getSectorPos(secID, self.sectorSize)
-            bytes += self.bytes[pos:pos+self.sectorSize]
+            pieces.append(self.bytes[pos:pos+self.sectorSize])
+        bytes = b"".join(pieces)
 
         self.entries = []
 
@@ -758,6 +1208,196 @@ entire file stream.
 
         return entry
 
+class Checker(object):
+    """Integrity checker for the sector allocation of a compound document.
+
+All sector chains (MSAT, SAT, SSAT, directory, root storage and streams) are
+walked once, while a bytearray records the kind of chain that owns each
+sector.  This finds cross-linked and orphan sectors, cycles, truncated chains
+and size mismatches in time linear in the number of sectors.
+"""
+
+    class Kind:
+        Free = 0
+        MSAT = 1
+        SAT = 2
+        SSAT = 3
+        Directory = 4
+        RootStorage = 5
+        Stream = 6
+
+    KindNames = {
+        Kind.MSAT:        "the MSAT",
+        Kind.SAT:         "the SAT",
+        Kind.SSAT:        "the SSAT",
+        Kind.Directory:   "the directory",
+        Kind.RootStorage: "the root storage",
+        Kind.Stream:      "another stream"
+    }
+
+    class Problem:
+        CrossLink = "cross-linked sector"
+        Orphan = "orphan sector"
+        Cycle = "cycle"
+        Truncated = "truncated chain"
+        SizeMismatch = "size mismatch"
+        BadMarker = "bad sector marker"
+        InvalidID = "invalid sector ID"
+
+    def __init__ (self, header, params):
+        self.header = header
+        self.params = params
+        # list of (Problem, message) pairs.
+        self.problems = []
+
+    def __report (self, problem, msg):
+        self.problems.append((problem, msg))
+
+    def __isValid (self, owners, secID, name):
+        """Report secID unless it is the index of a sector in owners."""
+        if secID < 0 or secID >= len(owners):
+            self.__report(Checker.Problem.InvalidID, "%s: sector %d is not in the allocation table"%(name, secID))
+            return False
+        return True
+
+    def __own (self, owners, secID, kind, name):
+        if owners[secID] != Checker.Kind.Free:
+            self.__report(Checker.Problem.CrossLink, "%s: sector %d is also used by %s"%
+                          (name, secID, Checker.KindNames[owners[secID]]))
+        else:
+            owners[secID] = kind
+
+    def __walk (self, owners, table, limit, initID, kind, name):
+        """Follow a chain, claiming its sectors in owners.  limit is the number
+of sectors that are actually present.  Return the chain and whether it ended
+properly."""
+        chain = []
+        chainSet = None
+        secID = initID
+        while True:
+            if not self.__isValid(owners, secID, name):
+                return chain, False
+            if secID >= limit:
+                self.__report(Checker.Problem.Truncated, "%s: sector %d is outside of the file"%(name, secID))
+                return chain, False
+            if owners[secID] != Checker.Kind.Free:
+                # only built on a conflict, which keeps the walk linear.
+                if chainSet == None:
+                    chainSet = set(chain)
+                if secID in chainSet:
+                    self.__report(Checker.Problem.Cycle, "%s: chain loops back to sector %d"%(name, secID))
+                else:
+                    self.__report(Checker.Problem.CrossLink, "%s: sector %d is also used by %s"%
+                                  (name, secID, Checker.KindNames[owners[secID]]))
+                return chain, False
+            owners[secID] = kind
+            chain.append(secID)
+            nextID = table[secID]
+            if nextID == -2:
+                return chain, True
+            if nextID < 0:
+                self.__report(Checker.Problem.Truncated, "%s: chain ends with %d after sector %d"%(name, nextID, secID))
+                return chain, False
+            secID = nextID
+
+    def __walkStream (self, owners, table, limit, entry, kind, secSize):
+        name = globals.encodeName(entry.Name.decode('utf-8', 'replace'), lowOnly=True)
+        if entry.StreamSectorID < 0:
+            if entry.StreamSize > 0:
+                self.__report(Checker.Problem.Truncated, "%s: no sectors for %d bytes"%(name, entry.StreamSize))
+            return []
+        chain, complete = self.__walk(owners, table, limit, entry.StreamSectorID, kind, name)
+        expected = (entry.StreamSize + secSize - 1) // secSize
+        if complete and len(chain) != expected:
+            self.__report(Checker.Problem.SizeMismatch, "%s: %d sectors for %d bytes, expected %d"%
+                          (name, len(chain), entry.StreamSize, expected))
+        return chain
+
+    def __checkOrphans (self, owners, table, limit, name):
+        for secID in range(0, min(len(table), limit)):
+            if owners[secID] == Checker.Kind.Free and table[secID] != -1:
+                self.__report(Checker.Problem.Orphan, "%s: sector %d is allocated but not used"%(name, secID))
+
+    def check (self):
+        """Check the document and return the list of (problem, message) pairs."""
+        self.problems = []
+        header = self.header
+        secSize = header.getSectorSize()
+        table = header.getSAT().array
+        owners = bytearray(len(table))
+        # sectors that are at least partially present in the file.
+        limit = (len(header.bytes) - 512 + secSize - 1) // secSize
+
+        # sectors of the MSAT and the SAT themselves.
+        msat = header.getMSAT()
+        for ids, kind, name, mark, count in ((msat.ownSectorIDs, Checker.Kind.MSAT, "MSAT", -4, header.numSecMSAT),
+                                             (msat.secIDs, Checker.Kind.SAT, "SAT", -3, header.numSecSAT)):
+            if len(ids) != count:
+                self.__report(Checker.Problem.SizeMismatch, "%s: %d sectors, the header says %d"%(name, len(ids), count))
+            for secID in ids:
+                if not self.__isValid(owners, secID, name):
+                    continue
+                self.__own(owners, secID, kind, name)
+                if table[secID] != mark:
+                    self.__report(Checker.Problem.BadMarker, "%s: sector %d is marked as %d instead of %d"%
+                                  (name, secID, table[secID], mark))
+
+        dirID = header.getFirstSectorID(BlockType.Directory)
+        if dirID < 0:
+            self.__report(Checker.Problem.Truncated, "directory: no sectors")
+            return self.problems
+        self.__walk(owners, table, limit, dirID, Checker.Kind.Directory, "directory")
+
+        ssatID = header.getFirstSectorID(BlockType.SSAT)
+        if ssatID >= 0:
+            chain, complete = self.__walk(owners, table, limit, ssatID, Checker.Kind.SSAT, "SSAT")
+            if complete and len(chain) != header.numSecSSAT:
+                self.__report(Checker.Problem.SizeMismatch, "SSAT: %d sectors, the header says %d"%
+                              (len(chain), header.numSecSSAT))
+
+        directory = header.getDirectory()
+        directory.parseDirEntries()
+        rootChain = []
+        shortEntries = []
+        for entry in directory.entries:
+            if entry.Type == Directory.Type.RootStorage:
+                rootChain = self.__walkStream(owners, table, limit, entry, Checker.Kind.RootStorage, secSize)
+            elif entry.Type == Directory.Type.UserStream:
+                if entry.StreamLocation == StreamLocation.SSAT:
+                    shortEntries.append(entry)
+                else:
+                    self.__walkStream(owners, table, limit, entry, Checker.Kind.Stream, secSize)
+        self.__checkOrphans(owners, table, limit, "SAT")
+
+        # short streams live in the sectors of the root storage.
+        ssat = header.getSSAT()
+        if ssat == None:
+            for entry in shortEntries:
+                if entry.StreamSize > 0:
+                    name = globals.encodeName(entry.Name.decode('utf-8', 'replace'), lowOnly=True)
+                    self.__report(Checker.Problem.Truncated, "%s: short stream without SSAT"%name)
+            return self.problems
+        shortSize = header.getShortSectorSize()
+        shortTable = ssat.array
+        shortOwners = bytearray(len(shortTable))
+        shortLimit = len(rootChain)*secSize // shortSize
+        for entry in shortEntries:
+            self.__walkStream(shortOwners, shortTable, shortLimit, entry, Checker.Kind.Stream, shortSize)
+        self.__checkOrphans(shortOwners, shortTable, shortLimit, "SSAT")
+        return self.problems
+
+    def output (self):
+        self.check()
+        globals.outputln("="*globals.OutputWidth)
+        globals.outputln("Integrity check")
+        globals.outputln("-"*globals.OutputWidth)
+        if len(self.problems) == 0:
+            globals.outputln("no problems found")
+        for problem, msg in self.problems:
+            globals.outputln("%s: %s"%(problem, msg))
+        return len(self.problems) == 0
+
+
 class DateTime:
     def __init__(self):
         self.day = 0
@@ -779,9 +1419,17 @@ class DirNode:
     def getName(self):
         return self.Entry.Name
 
+    def getLeafName(self):
+        # Entry.Name is utf-8 bytes
+        return self.Entry.Name.decode('utf-8', 'replace')
+
     def getHierarchicalName(self):
         return self.HierachicalName
 
+    def getParentName(self):
+        name = self.HierachicalName.rstrip('/')
+        return name[:name.rfind('/') + 1]
+
     def getChildren(self):
         return self.Nodes
 
@@ -790,11 +1438,30 @@ class DirNode:
 
 class OleContainer:
 
+    # operations of the sibling tree walk in __addChildren
+    class __SiblingOp:
+        Visit = 0
+        Prepend = 1
+        Append = 2
+
     def __init__(self,filePath, params ):
         self.filePath = filePath
         self.header = None
         self.rootNode = None
         self.params = params
+        # hierarchical name -> DirNode
+        self.index = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the file of the container, if it is still open."""
+        if self.header != None:
+            self.header.close()
 
     def __getModifiedTime(self, entry):
         # need parse/decode Entry.TimeModified
@@ -808,98 +1475,146 @@ class OleContainer:
         modified.second = 0
         return modified
 
-    def __parseFile (self):
-        if self.rootNode == None:
-            file = open(self.filePath, 'rb')
-            self.chars = file.read()
-            file.close()
+    def __parseHeader (self):
+        if self.header == None:
+            self.chars = readFile(self.filePath, self.params.mmap)
             self.header = Header(self.chars, self.params)
             self.header.parse()
+
+    def __parseFile (self):
+        if self.rootNode == None:
+            self.__parseHeader()
             self.obj = self.header.getDirectory()
             self.obj.parseDirEntries()
-            count = 0
             self.rootNode = self.__buildTree( self.obj.entries )
+            self.__buildIndex()
 
-    def __addSiblings( self, entries, parent, child ):
-        # add left siblings
-        nextLeft = child.Entry.DirIDLeft
-        if ( nextLeft > 0 ):
-            newEntry = DirNode( entries[ nextLeft ], self )
-#            newEntry.HierachicalName = parent.HierachicalName + globals.encodeName( newEntry.Entry.Name )
-            newEntry.HierachicalName = parent.HierachicalName + newEntry.Entry.Name
-            if  newEntry.Entry.DirIDRoot > 0:
-                newEntry.HierachicalName = newEntry.HierachicalName + '/'
-
-            self.__addSiblings( entries, parent, newEntry )
-            parent.Nodes.insert( 0, newEntry )
-
-        nextRight = child.Entry.DirIDRight
-        # add children to the right
-        if ( nextRight > 0 ):
-            newEntry = DirNode( entries[ nextRight ], self )
-#            newEntry.HierachicalName = parent.HierachicalName + globals.encodeName( newEntry.Entry.Name )
-            newEntry.HierachicalName = parent.HierachicalName + newEntry.Entry.Name
-            if  newEntry.Entry.DirIDRoot > 0:
-                newEntry.HierachicalName = newEntry.HierachicalName + '/'
-            self.__addSiblings( entries, parent, newEntry )
-            parent.Nodes.append( newEntry )
-
-    def __buildTreeImpl(self, entries, parent ):
-
-        if ( parent.Entry.DirIDRoot > 0 ):
-            newEntry = DirNode( entries[ parent.Entry.DirIDRoot ], self )
-#            newEntry.HierachicalName = parent.HierachicalName + globals.encodeName( newEntry.Entry.Name )
-            newEntry.HierachicalName = parent.HierachicalName +  newEntry.Entry.Name
-            if ( newEntry.Entry.DirIDRoot > 0 ):
-                newEntry.HierachicalName =  newEntry.HierachicalName + '/'
-
-            self.__addSiblings( entries, parent, newEntry )
-            parent.Nodes.append( newEntry )
-
-        for child in parent.Nodes:
-            if child.Entry.DirIDRoot > 0:
-                self.__buildTreeImpl( entries, child )
+    def __scanFile (self):
+        # Only reads the header and the directory, see scanFile().
+        if self.rootNode == None:
+            if self.header == None:
+                self.header = scanFile(self.filePath, self.params)
+                self.chars = self.header.bytes
+            self.obj = self.header.getDirectory()
+            self.rootNode = self.__buildTree( self.obj.entries )
+            self.__buildIndex()
+
+    def __newNode( self, entries, parent, entryID ):
+        node = DirNode( entries[ entryID ], self )
+        node.HierachicalName = parent.HierachicalName + node.getLeafName()
+        if node.Entry.DirIDRoot > 0:
+            node.HierachicalName = node.HierachicalName + '/'
+        return node
+
+    def __addChildren( self, entries, parent, placed ):
+        # The children of a storage form a red-black tree linked by the left
+        # and right sibling IDs.  Walk it with an explicit stack so that
+        # deep or degenerate trees can't hit the recursion limit, keeping
+        # the order in which the children have always been listed: left
+        # siblings get prepended, right siblings appended, and the entry
+        # the storage points to comes last.
+        firstID = parent.Entry.DirIDRoot
+        if firstID in placed:
+            return
+        placed.add( firstID )
+        first = self.__newNode( entries, parent, firstID )
+
+        Op = OleContainer.__SiblingOp
+        siblings = collections.deque()
+        stack = [ ( Op.Visit, first ) ]
+        while len( stack ) > 0:
+            op, node = stack.pop()
+            if op == Op.Prepend:
+                siblings.appendleft( node )
+                continue
+            elif op == Op.Append:
+                siblings.append( node )
+                continue
+
+            ops = []
+            leftID = node.Entry.DirIDLeft
+            if leftID > 0 and leftID not in placed:
+                placed.add( leftID )
+                left = self.__newNode( entries, parent, leftID )
+                ops.append( ( Op.Visit, left ) )
+                ops.append( ( Op.Prepend, left ) )
+            rightID = node.Entry.DirIDRight
+            if rightID > 0 and rightID not in placed:
+                placed.add( rightID )
+                right = self.__newNode( entries, parent, rightID )
+                ops.append( ( Op.Visit, right ) )
+                ops.append( ( Op.Append, right ) )
+            ops.reverse()
+            stack.extend( ops )
+
+        siblings.append( first )
+        parent.Nodes.extend( siblings )
 
     def __buildTree(self, entries ):
         treeRoot = DirNode( entries[0], self )
-        self.__buildTreeImpl( entries, treeRoot )
+        # IDs of the entries already in the tree, which guards against
+        # cycles in bad files.
+        placed = set( [ 0 ] )
+        storages = [ treeRoot ]
+        while len( storages ) > 0:
+            parent = storages.pop()
+            if parent.Entry.DirIDRoot > 0:
+                self.__addChildren( entries, parent, placed )
+            for child in parent.Nodes:
+                if child.Entry.DirIDRoot > 0:
+                    storages.append( child )
         return treeRoot
 
-    def __findEntryByHierachicalName( self, node, name ):
-        if node.HierachicalName == name:
-            return node.Entry
-        else:
-            for child in node.Nodes:
-                result = self.__findEntryByHierachicalName( child, name )
-                if result != None:
-                    return result
-        return None
+    def __buildIndex( self ):
+        self.index = {}
+        for node in self.walk():
+            if node.HierachicalName not in self.index:
+                self.index[ node.HierachicalName ] = node
 
     def __printListReport( self, treeNode ):
 
-        dateInfo = self.__getModifiedTime( treeNode.Entry )
-
-        if len( treeNode.HierachicalName ) > 0 :
-            globals.outputln('{0:8d}  {1:0<2d}-{2:0<2d}-{3:0<2d} {4:0<2d}:{5:0<2d}   {6}'.format(treeNode.Entry.StreamSize, dateInfo.day, dateInfo.month, dateInfo.year, dateInfo.hour, dateInfo.second, treeNode.HierachicalName ))
-
-        for node in treeNode.Nodes:
-            # ignore the root
-            self.__printListReport( node )
+        for node in self.walk( treeNode ):
+            if len( node.HierachicalName ) > 0 :
+                dateInfo = self.__getModifiedTime( node.Entry )
+                globals.outputln('{0:8d}  {1:0<2d}-{2:0<2d}-{3:0<2d} {4:0<2d}:{5:0<2d}   {6}'.format(node.Entry.StreamSize, dateInfo.day, dateInfo.month, dateInfo.year, dateInfo.hour, dateInfo.second, globals.encodeName( node.HierachicalName, lowOnly=True ) ))
 
     def __printHeader(self):
-        globals.outputln("OLE: %s")%self.filePath
+        globals.outputln("OLE: %s"%getattr( self.filePath, 'name', self.filePath ))
         globals.outputln(" Length     Date   Time    Name")
         globals.outputln("--------    ----   ----    ----")
 
     def list(self):
         # need to share the inititialisation and parse stuff between the different options
 
-        self.__parseFile()
+        self.__scanFile()
         if  self.rootNode != None:
             self.__printHeader()
             self.__printListReport( self.rootNode )
             # need to print a footer ( total bytes, total files like unzip )
 
+    def walk( self, node=None ):
+        """Yield all nodes below and including node (the root node by
+default) in depth-first order, without recursion."""
+        self.__parseFile()
+        if node == None:
+            node = self.rootNode
+        if node == None:
+            return
+        stack = [ node ]
+        while len( stack ) > 0:
+            node = stack.pop()
+            yield node
+            stack.extend( reversed( node.Nodes ) )
+
+    def getNode( self, name ):
+        """Return the node with the given hierarchical name, or None.
+Storage names end with a '/'."""
+        self.__parseFile()
+        return self.index.get( name )
+
+    def exists( self, name ):
+        return self.getNode( name ) != None
+
     def getStreamForEntry( self, entry ):
         if  entry == None or entry.DirIDRoot > 0 :
             raise Exception("can't get stream for invalid entry")
@@ -911,20 +1626,143 @@ class OleContainer:
     def getStreamForName( self, name ):
         self.__parseFile()
         if  self.rootNode != None:
-            entry = self.__findEntryByHierachicalName( self.rootNode, name )
-            return self.getStreamForEntry( entry )
+            node = self.getNode( name )
+            if node == None:
+                return self.getStreamForEntry( None )
+            return self.getStreamForEntry( node.Entry )
 
     def extract(self, name):
         self.__parseFile()
         if  self.rootNode != None:
-            entry = self.__findEntryByHierachicalName( self.rootNode, name )
+            node = self.getNode( name )
+            if node == None:
+                entry = None
+            else:
+                entry = node.Entry
             bytes = self.getStreamForEntry( entry )
             file = open(entry.Name, 'wb')
             file.write( bytes )
-            file.close
+            file.close()
         else:
             globals.outputln("failed to initialise ole container")
 
+    @staticmethod
+    def __getFileName( node ):
+        # '/' and control characters (as in '\x05SummaryInformation') are
+        # escaped the way encodeName() does it.
+        name = ''
+        for c in node.getLeafName():
+            if c == '/' or ord( c ) < 0x20:
+                name += "\\x%2.2X"%ord( c )
+            else:
+                name += c
+        if name in ( '', '.', '..' ):
+            name = name.replace( '.', '\\x2E' ) or '\\x00'
+        return name
+
+    @staticmethod
+    def __getFileNames( node ):
+        """Return the file names of the children of node.  Escaping can give
+two siblings the same name, so later ones get a '~N' suffix."""
+        names = []
+        used = set()
+        for child in node.Nodes:
+            name = OleContainer.__getFileName( child )
+            unique = name
+            n = 1
+            # compound file names are compared without case, and so are the
+            # file names on some file systems.
+            while unique.lower() in used:
+                unique = '%s~%d'%( name, n )
+                n += 1
+            used.add( unique.lower() )
+            names.append( unique )
+        return names
+
+    def __writeAll( self, fd, bytes ):
+        view = memoryview( bytes )
+        while len( view ) > 0:
+            view = view[ os.write( fd, view ): ]
+
+    def __writeStream( self, path, sourceFd, ranges, bytes ):
+        fd = os.open( path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr( os, 'O_BINARY', 0 ), 0o666 )
+        try:
+            if ranges == None:
+                self.__writeAll( fd, bytes )
+                return
+            for pos, length in ranges:
+                # copy each run of contiguous sectors directly from the
+                # container file if possible.
+                while sourceFd != None and length > 0:
+                    try:
+                        sent = os.sendfile( fd, sourceFd, pos, length )
+                    except OSError:
+                        sent = 0
+                    if sent == 0:
+                        break
+                    pos += sent
+                    length -= sent
+                if length > 0:
+                    self.__writeAll( fd, self.chars[ pos:pos + length ] )
+        finally:
+            os.close( fd )
+
+    def extractAll( self, directory, threads=4 ):
+        """Write every stream of the container to a file below directory, with
+a sub-directory for each storage.  Return the number of streams written.
+
+The streams are copied straight from the container file, one run of
+contiguous sectors at a time, by a pool of threads."""
+        self.__parseFile()
+        if  self.rootNode == None:
+            globals.outputln("failed to initialise ole container")
+            return 0
+
+        sourceFd = None
+        if hasattr( os, 'sendfile' ) and not hasattr( self.filePath, 'read' ) and self.filePath != '-':
+            sourceFd = os.open( self.filePath, os.O_RDONLY | getattr( os, 'O_BINARY', 0 ) )
+        import concurrent.futures
+        try:
+            pool = concurrent.futures.ThreadPoolExecutor( max_workers=threads )
+            try:
+                jobs = []
+                stack = [ ( self.rootNode, directory ) ]
+                while len( stack ) > 0:
+                    node, path = stack.pop()
+                    if node.Entry.isStorage():
+                        if not os.path.isdir( path ):
+                            os.makedirs( path )
+                        for child, name in zip( node.Nodes, OleContainer.__getFileNames( node ) ):
+                            stack.append( ( child, os.path.join( path, name ) ) )
+                        continue
+
+                    entry = node.Entry
+                    view = self.obj.getStreamView( entry )
+                    if isinstance( view, SectorChainView ) and view.getBase() is self.chars:
+                        ranges = view.getBaseRanges( 0, min( entry.StreamSize, len( view ) ) )
+                        bytes = None
+                    else:
+                        # some sectors are outside of the file, of the stream
+                        # or of the root storage that holds the short stream,
+                        # so the ranges are not file positions.
+                        ranges = None
+                        bytes = view[ 0:entry.StreamSize ]
+                    jobs.append( pool.submit( self.__writeStream, path, sourceFd, ranges, bytes ) )
+                for job in jobs:
+                    job.result()
+            finally:
+                pool.shutdown()
+        finally:
+            if sourceFd != None:
+                os.close( sourceFd )
+        return len( jobs )
+
+    def check(self):
+        """Print the problems of the sector allocation, see Checker.  Return
+True if there are none."""
+        self.__parseHeader()
+        return Checker( self.header, self.params ).output()
+
     def read(self):
         self.__parseFile()
 
@@ -15,6 +15,10 @@ def main ():
     parser = optparse.OptionParser()
     parser.add_option("-l", "--list", action="store_true", dest="list", default=False, help="lists ole contents")
     parser.add_option("-x", "--extract", action="store_true", dest="extract", default=False, help="extract file")
+    parser.add_option("--extract-all", dest="extractAll", default=None, metavar="DIR", help="extract all streams into DIR, one sub-directory per storage")
+    parser.add_option("-j", "--jobs", type="int", dest="jobs", default=4, help="number of threads writing the extracted streams")
+    parser.add_option("-c", "--check", action="store_true", dest="check", default=False, help="check the sector allocation of the file for corruption")
+    parser.add_option("--mmap", action="store_true", dest="mmap", default=False, help="map the file into memory instead of reading it all at once")
 
 
     options, args = parser.parse_args()
@@ -23,24 +27,29 @@ def main ():
 
     params.list =  options.list
     params.extract =  options.extract
+    params.mmap = options.mmap
 
     if len(args) < 1:
         globals.error("takes at least one argument\n")
         parser.print_help()
         sys.exit(1)
 
-    container = ole.OleContainer( args[ 0 ], params )
+    with ole.OleContainer( args[ 0 ], params ) as container:
+        if params.list == True:
+            container.list()
+        if options.check and not container.check():
+            sys.exit(1)
+        if params.extract:
+           files = args
+           files.pop(0)
 
-    if params.list == True:
-        container.list()
-    if params.extract:
-       files = args
-       files.pop(0)
-
-       for file in files:
-           container.extract( file )
+           for file in files:
+               container.extract( file )
+        if options.extractAll != None:
+            container.extractAll( options.extractAll, options.jobs )
 
 if __name__ == '__main__':
-    main()
+    with globals.OutputSink():
+        main()
 
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
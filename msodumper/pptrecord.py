@@ -41,17 +41,18 @@ append a line to be displayed.
 
     def output (self):
         self.parseBytes()
+        jsonl = globals.getContext().jsonl
+        if jsonl is not None:
+            for line in self.lines:
+                jsonl.addLine(self, line)
+            return
         self.__print("%4.4Xh: %s"%(self.recordType, "-"*61))
         for line in self.lines:
             self.__print("%4.4Xh: %s"%(self.recordType, line))
 
     def appendText(self, text):
-        global textdump
-        # unfortunaley we have no access to the globals.params, so we
-        # can't keep the text local and let output() behave according
-        # to params. Have to use a global if we want to keep a minimal
-        # modification
-        globals.textdump += text + b"\n"
+        # collected in the context of the dump, printed by globals.dumptext()
+        globals.getContext().textdump += text + b"\n"
 
     def appendLine (self, line):
         self.lines.append(line)
@@ -6,9 +6,11 @@
 #
 from builtins import range
 import sys
-from . import ole, globals, pptrecord
+from . import ole, globals, hexdump
 from .globals import output
 
+pptrecord = globals.HandlerRegistry('pptrecord')
+
 class EndOfStream(Exception): pass
 
 class PPTFile(object):
@@ -19,11 +21,6 @@ class PPTFile(object):
         self.version = None
         self.params = params
 
-        # If we are a text dumper, skip irrelevant records
-        global recData, textRecData
-        if params.noStructOutput and params.dumpText:
-            recData = textRecData
-
         self.header = ole.Header(self.chars, self.params)
         self.pos = self.header.parse()
 
@@ -70,7 +67,7 @@ class PPTFile(object):
         obj = self.__getDirectoryObj()
         bytes = []
         if obj is not None:
-            bytes = obj.getRawStreamByName(name)
+            bytes = obj.getStreamViewByName(name)
         strm = PPTDirStream(bytes, self.params)
         return strm
 
@@ -85,6 +82,12 @@ class PPTDirStream(object):
         self.params = params
         self.properties = {"recordInfo": recordInfo}
 
+        # If we are a text dumper, skip irrelevant records
+        if params.noStructOutput and params.dumpText:
+            self.recData = textRecData
+        else:
+            self.recData = recData
+
 
     def readBytes (self, size=1):
         if self.size - self.pos < size:
@@ -120,8 +123,8 @@ class PPTDirStream(object):
         if self.params.noStructOutput and self.params.dumpText:
             return
         self.__printSep('=', recordType = recordType)
-        if recordType in recData:
-            self.__print("[%s]"%recData[recordType][0], recordType)
+        if recordType in self.recData:
+            self.__print("[%s]"%self.recData[recordType][0], recordType)
         else:
             self.__print("[anon record]", recordType)
         self.__print("(type: %4.4Xh (%d) inst: %4.4Xh (%d), vers: %4.4Xh, start: %d, size: %d)"%
@@ -132,16 +135,13 @@ class PPTDirStream(object):
     def printRecordDump (self, bytes, recordType):
         if self.params.noStructOutput and self.params.dumpText:
             return
+        if not globals.outputEnabled(recordType):
+            return
         size = len(bytes)
         self.__printSep('-', 61, "%4.4Xh: "%recordType, recordType = recordType)
-        for i in range(0, size):
-            if (i+1) % 16 == 1:
-                output(self.prefix + "%4.4Xh: "%recordType, recordType = recordType)
-            output("%2.2X "%globals.indexbytes(bytes, i), recordType = recordType)
-            if (i+1) % 16 == 0 and i != size-1:
-                globals.outputln("", recordType = recordType)
+        hexdump.dumpLabelledLines(bytes, lambda text: output(text, recordType = recordType),
+                                  self.prefix + "%4.4Xh: "%recordType, chars=False)
         if size > 0:
-            globals.outputln("", recordType = recordType)
             self.__printSep('-', 61, "%4.4Xh: "%recordType, recordType = recordType)
 
 
@@ -155,11 +155,21 @@ class PPTDirStream(object):
 
         globals.outputln("", recordType = recordType)
         self.printRecordHeader(startPos, recordInstance, recordVersion, recordType, size)
+        name = None
+        if recordType in self.recData:
+            name = self.recData[recordType][0]
+        globals.beginRecord(startPos, recordType, name, size)
+        try:
+            self.__readRecordData(recordInstance, recordVersion, recordType, size)
+        finally:
+            globals.endRecord()
+
+    def __readRecordData (self, recordInstance, recordVersion, recordType, size):
         bytes = self.readBytes(size)
 
         recordInfo = None
-        if recordType in recData and len(recData[recordType]) >= 2:
-            recordInfo = recData[recordType]
+        if recordType in self.recData and len(self.recData[recordType]) >= 2:
+            recordInfo = self.recData[recordType]
 
         if recordVersion == 0x0F:
             # substream? recurse into that
@@ -207,7 +207,7 @@ class CompressedVBAStream(VBAStreamBase):
             self.CompressedCurrent += 2
 
     def __decompressTokenSequence (self):
-        flagByte = struct.unpack("b", self.chars[self.CompressedCurrent ])[0]
+        flagByte = struct.unpack("b", self.chars[self.CompressedCurrent:self.CompressedCurrent+1])[0]
         self.CompressedCurrent += 1
         if  self.CompressedCurrent < self.CompressedEnd:
             for i in range(0,8):
@@ -246,7 +246,7 @@ class CompressedVBAStream(VBAStreamBase):
         self.CompressedRecordEnd = len(self.chars )
         self.DeCompressedBufferEnd = 0
         self.DecompressedChunkStart = 0
-        val = struct.unpack("b", self.chars[self.CompressedCurrent])[0]
+        val = struct.unpack("b", self.chars[self.CompressedCurrent:self.CompressedCurrent+1])[0]
         if val == 1:
             self.CompressedCurrent += 1
             while self.CompressedCurrent < self.CompressedRecordEnd:
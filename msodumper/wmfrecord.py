@@ -5,7 +5,8 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 
-from .binarystream import BinaryStream
+from .binarystream import BinaryStream, Schema, Field
+from . import globals
 import base64
 
 PlaceableKey = {
@@ -615,6 +616,7 @@ class WMFStream(BinaryStream):
             type = record[0]
             # WmfHeader is already dumped
             if i:
+                globals.beginRecord(self.pos, id, type, size * 2)
                 print('<record index="%s" type="%s">' % (i, type))
                 if len(record) > 1:
                     handler = record[1](self)
@@ -622,6 +624,7 @@ class WMFStream(BinaryStream):
                 else:
                     print('<todo/>')
                 print('</record>')
+                globals.endRecord()
             # META_EOF
             if type == "META_EOF":
                 break
@@ -661,6 +664,13 @@ class Rect(WMFRecord):
 
 class RectL(WMFRecord):
     """The RectL Object defines a rectangle."""
+    schema = Schema([
+        Field("Left", "i", hexdump=False),
+        Field("Top", "i", hexdump=False),
+        Field("Right", "i", hexdump=False),
+        Field("Bottom", "i", hexdump=False),
+    ])
+
     def __init__(self, parent, name=None):
         WMFRecord.__init__(self, parent)
         if name:
@@ -670,10 +680,7 @@ class RectL(WMFRecord):
 
     def dump(self):
         print('<%s type="RectL">' % self.name)
-        self.printAndSet("Left", self.readInt32(), hexdump=False)
-        self.printAndSet("Top", self.readInt32(), hexdump=False)
-        self.printAndSet("Right", self.readInt32(), hexdump=False)
-        self.printAndSet("Bottom", self.readInt32(), hexdump=False)
+        self.schema.readAndDump(self)
         print('</%s>' % self.name)
         self.parent.pos = self.pos
 
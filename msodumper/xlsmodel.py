@@ -5,6 +5,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 from builtins import range
+import array
 from . import globals, node, formula
 
 
@@ -72,6 +73,19 @@ class Workbook(ModelBase):
 
         return nd
 
+    def writeXML (self, writer):
+        """Write the same XML as createDOM() to a node.XMLWriter, one sheet
+row at a time."""
+        writer.startElement('workbook', {'encrypted': self.encrypted})
+        sheets = list(filter(lambda x: isinstance(x, Worksheet), self.__sheets))
+        if len(sheets) > 0:
+            wbglobal = self.getWorkbookGlobal()
+            writer.appendNode(wbglobal.createDOM(self))
+            for (i,sheet) in enumerate(sheets):
+                data = wbglobal.getSheetData(i-1)
+                sheet.writeXML(self, writer, {'name': data.name, 'visible': data.visible})
+        writer.endElement()
+
 
 class SheetBase(object):
 
@@ -227,10 +241,24 @@ class WorkbookGlobal(SheetBase):
     def appendSharedString (self, sst):
         self.__sharedStrings.append(sst)
 
+    def setSharedStrings (self, sharedStrings):
+        """Set all shared strings at once, as a sequence like the
+xlsrecord.SharedStringTable of the SST record."""
+        self.__sharedStrings = sharedStrings
+
+    def getSharedStrings (self):
+        return self.__sharedStrings
+
     def getSharedString (self, strID):
         if len(self.__sharedStrings) <= strID:
             return None
-        return self.__sharedStrings[strID]
+        try:
+            return self.__sharedStrings[strID]
+        except globals.ByteStreamError:
+            # the strings of an SST record are decoded on first use.
+            if not globals.getContext().params.catchExceptions:
+                raise
+            return None
 
     def appendSupbook (self, sb):
         self.__supbooks.append(sb)
@@ -300,7 +328,7 @@ class Worksheet(SheetBase):
 
     def __init__ (self, sheetID):
         SheetBase.__init__(self, SheetBase.Type.Worksheet)
-        self.__rows = {}
+        self.__cells = CellStore()
         self.__autoFilterArrows = []
         self.__sheetID = sheetID
         self.__firstDefinedCell = None
@@ -308,7 +336,6 @@ class Worksheet(SheetBase):
         self.__hiddenRows = Worksheet.OrderedRangeList()
         self.__rowHeights = Worksheet.OrderedRangeList()
         self.__shapes = []
-        self.__lastCell = None
         self.__condFormats = []
         self.__dataValidations = []
 
@@ -333,15 +360,21 @@ class Worksheet(SheetBase):
     def setAutoFilterArrow (self, filterID, obj):
         self.__autoFilterArrows[filterID] = obj
 
-    def setCell (self, col, row, cell):
-        if not row in self.__rows:
-            self.__rows[row] = {}
+    def setLabelCell (self, col, row, strID, xfIdx):
+        self.__cells.append(col, row, CellBase.Type.Label, xfIdx, strID=strID)
 
-        self.__rows[row][col] = cell
-        self.__lastCell = cell
+    def setNumberCell (self, col, row, value, xfIdx):
+        self.__cells.append(col, row, CellBase.Type.Number, xfIdx, value=value)
 
-    def getLastCell (self):
-        return self.__lastCell
+    def setFormulaCell (self, col, row, tokens, cachedResult, xfIdx):
+        self.__cells.append(col, row, CellBase.Type.Formula, xfIdx, formula=[tokens, cachedResult])
+
+    def setLastFormulaResult (self, cachedResult):
+        """Set the cached result of the last cell, if it is a formula cell."""
+        self.__cells.setLastFormulaResult(cachedResult)
+
+    def getCells (self):
+        return self.__cells
 
     def setRowHidden (self, row):
         self.__hiddenRows.setValue(row, True)
@@ -359,41 +392,71 @@ class Worksheet(SheetBase):
         self.__dataValidations.append(dv)
 
     def createDOM (self, wb):
-        nd = node.Element('worksheet')
-        nd.setAttr('version', self.version)
+        nd = node.Element('worksheet', self.__getAttrs())
 
         # cells
-        rows = sorted(self.__rows.keys())
-        for row in rows:
+        cells = self.__cells
+        for row, indexes in cells.iterRows():
             rowNode = nd.appendElement('row')
             rowNode.setAttr('id', row)
-            cols = self.__rows[row].keys()
-            for col in cols:
-                cell = self.__rows[row][col]
-                cellNode = cell.createDOM(wb)
+            for i in indexes:
+                cellNode = cells.getCell(i).createDOM(wb)
                 rowNode.appendChild(cellNode)
-                cellNode.setAttr('col', col)
+                cellNode.setAttr('col', cells.cols[i])
+
+        self.__appendTrailingNodes(wb, nd)
+        return nd
+
+    def writeXML (self, wb, writer, attrs=None):
+        """Write the same XML as createDOM() to a node.XMLWriter, without
+building the nodes of more than one cell at a time."""
+        allAttrs = self.__getAttrs()
+        if attrs != None:
+            allAttrs.update(attrs)
+        writer.startElement('worksheet', allAttrs)
+
+        # cells
+        cells = self.__cells
+        for row, indexes in cells.iterRows():
+            writer.startElement('row', {'id': row})
+            for i in indexes:
+                cellNode = cells.getCell(i).createDOM(wb)
+                cellNode.setAttr('col', cells.cols[i])
+                writer.appendNode(cellNode)
+            writer.endElement()
+
+        # the remaining nodes are small, build them first
+        nd = node.Element('worksheet')
+        self.__appendTrailingNodes(wb, nd)
+        for child in nd.getChildNodes():
+            writer.appendNode(child)
+        writer.endElement()
+
+    def __getAttrs (self):
+        attrs = {'version': self.version}
 
         # table dimension
         if self.__firstDefinedCell != None:
-            nd.setAttr('first-defined-cell', self.__firstDefinedCell.getName())
+            attrs['first-defined-cell'] = self.__firstDefinedCell.getName()
 
         if self.__firstFreeCell != None:
             try:
-                nd.setAttr('first-free-cell', self.__firstFreeCell.getName())
+                attrs['first-free-cell'] = self.__firstFreeCell.getName()
             except Exception as e:
-                if not globals.params.catchExceptions:
+                if not globals.getContext().params.catchExceptions:
                     raise
                 globals.error("createDOM: trying set firstFreeCell: %s\n" % e)
                 pass
 
+        return attrs
+
+    def __appendTrailingNodes (self, wb, nd):
         self.__appendAutoFilterNode(wb, nd) # autofilter (if exists)
         self.__appendHiddenRowsNode(wb, nd) # hidden rows
         self.__appendRowHeightNode(wb, nd)  # row heights
         self.__appendShapesNode(wb, nd)     # drawing objects
         self.__appendCondFormatNode(wb, nd) # conditional formatting
         self.__appendDataValidationNode(wb, nd) # conditional formatting
-        return nd
 
     def __appendRowHeightNode (self, wb, baseNode):
         if self.__rowHeights.getLength() == 0:
@@ -488,6 +551,7 @@ class CellBase(object):
 
     def __init__ (self, modelType):
         self.modelType = modelType
+        self.xfIdx = None
 
 
 class LabelCell(CellBase):
@@ -529,7 +593,7 @@ class FormulaCell(CellBase):
                 parser.parse()
                 nd.setAttr('formula', parser.getText())
             except:
-                if not globals.params.catchExceptions:
+                if not globals.getContext().params.catchExceptions:
                     raise
                 pass
             s = globals.getRawBytes(self.tokens, True, False)
@@ -540,6 +604,85 @@ class FormulaCell(CellBase):
         return nd
 
 
+class CellStore(object):
+    """The cells of a worksheet, in parallel arrays instead of a cell object
+per cell.  Cells are appended in stream order, which is row order in well
+formed files; cell objects are only created by getCell(), one at a time,
+when the sheet is written out."""
+
+    # stored in place of an xfIdx of None.
+    NoXF = -1
+
+    def __init__ (self):
+        self.rows = array.array('i')
+        self.cols = array.array('i')
+        self.types = array.array('B')   # CellBase.Type
+        self.xfs = array.array('i')     # XF record index
+        self.values = array.array('d')  # value of number cells
+        self.refs = array.array('I')    # SST index of label cells, formula index of formula cells
+        self.formulas = []              # [tokens, cachedResult] of formula cells
+        self.__inRowOrder = True
+
+    def __len__ (self):
+        return len(self.rows)
+
+    def append (self, col, row, cellType, xfIdx, value=0.0, strID=0, formula=None):
+        if len(self.rows) > 0 and row < self.rows[-1]:
+            self.__inRowOrder = False
+        ref = strID
+        if formula != None:
+            ref = len(self.formulas)
+            self.formulas.append(formula)
+        self.rows.append(row)
+        self.cols.append(col)
+        self.types.append(cellType)
+        if xfIdx is None:
+            xfIdx = CellStore.NoXF
+        self.xfs.append(xfIdx)
+        self.values.append(value)
+        self.refs.append(ref)
+
+    def setLastFormulaResult (self, cachedResult):
+        if len(self.types) > 0 and self.types[-1] == CellBase.Type.Formula:
+            self.formulas[self.refs[-1]][1] = cachedResult
+
+    def iterRows (self):
+        """Yield each row in ascending order, with the indexes of its cells
+in the order their columns were first set.  A cell that is set more than
+once keeps its first position and gets its last value."""
+        rows, cols = self.rows, self.cols
+        order = range(len(rows))
+        if not self.__inRowOrder:
+            # sorted() is stable, so cells keep their order within a row.
+            order = sorted(order, key=rows.__getitem__)
+        current = None
+        indexes = {}
+        for i in order:
+            if rows[i] != current:
+                if len(indexes) > 0:
+                    yield current, list(indexes.values())
+                current = rows[i]
+                indexes = {}
+            indexes[cols[i]] = i
+        if len(indexes) > 0:
+            yield current, list(indexes.values())
+
+    def getCell (self, i):
+        """Create the cell object of the ith cell."""
+        cellType = self.types[i]
+        if cellType == CellBase.Type.Label:
+            cell = LabelCell()
+            cell.strID = self.refs[i]
+        elif cellType == CellBase.Type.Number:
+            cell = NumberCell(self.values[i])
+        else:
+            cell = FormulaCell()
+            cell.tokens, cell.cachedResult = self.formulas[self.refs[i]]
+        if self.xfs[i] != CellStore.NoXF:
+            cell.xfIdx = self.xfs[i]
+        return cell
+
+
 class AutoFilterArrow(object):
 
     def __init__ (self, filterID):
@@ -5,8 +5,12 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 from builtins import range
-import struct, sys
-from . import globals, formula, xlsmodel, msodraw
+import struct, sys, bisect
+from . import globals
+
+formula = globals.LazyModule('formula')
+xlsmodel = globals.LazyModule('xlsmodel')
+msodraw = globals.LazyModule('msodraw')
 
 from .globals import debug
 
@@ -372,7 +376,7 @@ class XLStream(globals.ByteStream):
 
         if fHighByte:
             rgb = self.readBytes(2*cch).decode('UTF-16LE', errors='replace')
-        elif globals.params.utf8:
+        elif globals.getContext().params.utf8:
             # Compressed Unicode-> latin1
             rgb = self.readBytes(cch).decode('cp1252')
         else:
@@ -437,6 +441,11 @@ Like parseBytes(), the derived classes must overwrite this method."""
         return "%4.4Xh: "%self.header
 
     def output (self):
+        jsonl = globals.getContext().jsonl
+        if jsonl is not None:
+            self.__outputJSON(jsonl)
+            return
+
         headerStr = self.__getHeaderStr()
         globals.outputln(headerStr + "-"*(globals.OutputWidth-len(headerStr)))
         try:
@@ -447,12 +456,29 @@ Like parseBytes(), the derived classes must overwrite this method."""
                 try:
                     globals.outputln(headerStr.encode('ascii') + line)
                 except:
-                    if not globals.params.catchExceptions:
+                    if not globals.getContext().params.catchExceptions:
                         raise
                     globals.outputln(headerStr + "(xlsrecord:unprintable)")
         except globals.ByteStreamError:
             globals.outputln(headerStr + "Error interpreting the record!")
 
+    def __outputJSON (self, jsonl):
+        """Add the parsed data to the current record of the JSON Lines output,
+from dumpData() if the handler has it, from the lines otherwise."""
+        try:
+            if type(self).dumpData is not BaseRecordHandler.dumpData:
+                data = self.dumpData()
+                if data is not None:
+                    for key in data[1].keys():
+                        jsonl.setField(self, key, data[1][key])
+                    return
+                self.pos = 0
+            self.parseBytes()
+            for line in self.lines:
+                jsonl.addLine(self, line)
+        except globals.ByteStreamError:
+            jsonl.addLine(self, "Error interpreting the record!")
+
     def debug (self, msg):
         globals.outputln("%4.4Xh: %s"%(self.header, msg))
 
@@ -1277,10 +1303,7 @@ class Formula(BaseRecordHandler):
     def fillModel (self, model):
         self.__parseBytes()
         sheet = model.getCurrentSheet()
-        cell = xlsmodel.FormulaCell()
-        cell.tokens = self.tokens
-        cell.cachedResult = self.fval
-        sheet.setCell(self.col, self.row, cell)
+        sheet.setFormulaCell(self.col, self.row, self.tokens, self.fval, self.xf)
 
 
 class HorBreaks(BaseRecordHandler):
@@ -1364,9 +1387,7 @@ class LabelSST(BaseRecordHandler):
     def fillModel (self, model):
         self.__parseBytes()
         sheet = model.getCurrentSheet()
-        cell = xlsmodel.LabelCell()
-        cell.strID = self.strId
-        sheet.setCell(self.col, self.row, cell)
+        sheet.setLabelCell(self.col, self.row, self.strId, self.xfIdx)
 
 
 class MulRK(BaseRecordHandler):
@@ -1403,8 +1424,7 @@ class MulRK(BaseRecordHandler):
         for i in range(0, n):
             rkrec = self.rkrecs[i]
             col = self.col1 + i
-            cell = xlsmodel.NumberCell(decodeRK(rkrec.number))
-            sheet.setCell(col, self.row, cell)
+            sheet.setNumberCell(col, self.row, decodeRK(rkrec.number), rkrec.xfIdx)
 
 class MulBlank(BaseRecordHandler):
 
@@ -1653,8 +1673,7 @@ class RK(BaseRecordHandler):
     def fillModel (self, model):
         self.__parseBytes()
         sheet = model.getCurrentSheet()
-        cell = xlsmodel.NumberCell(self.realVal)
-        sheet.setCell(self.col, self.row, cell)
+        sheet.setNumberCell(self.col, self.row, self.realVal, self.xf)
 
 class Scl(BaseRecordHandler):
 
@@ -1698,9 +1717,7 @@ class String(BaseRecordHandler):
 
     def fillModel (self, model):
         self.__parseBytes()
-        cell = model.getCurrentSheet().getLastCell()
-        if cell.modelType == xlsmodel.CellBase.Type.Formula:
-            cell.cachedResult = self.name
+        model.getCurrentSheet().setLastFormulaResult(self.name)
 
 
 class Style(BaseRecordHandler):
@@ -1738,31 +1755,243 @@ class Style(BaseRecordHandler):
                 self.appendLine("built-in level: %d"%self.builtInLevel)
 
 
+# character count and flags of a string in an SST record
+SSTStringHeader = struct.Struct('<HB')
+
+class SharedStringTable(object):
+    """The strings of an SST record, as globals.UnicodeRichExtText objects
+that are decoded when they are first used.
+
+The strings are decoded in one walk over the record, which keeps track of
+the next CONTINUE record boundary, where a string can switch between
+compressed and UTF-16 characters.  Strings after the ones decoded so far
+are found from the offsets of the EXTSST record, if setHints() got them.
+Those offsets come from the file, so they are checked against the record and
+CONTINUE boundaries first, and each bucket decoded from one has to end right
+at the next one.  If any check fails, all of them are dropped, and the
+strings are decoded in order instead."""
+
+    def __init__ (self, bytes, roflist, count, pos):
+        self.bytes = bytes
+        self.bounds = roflist
+        if len(self.bounds) == 0:
+            self.bounds = [len(bytes)]
+        self.count = max(count, 0)
+        self.strings = [None]*self.count
+        # the strings before self.decoded are decoded, the next one is at
+        # self.pos, and the next record boundary is self.bounds[self.bound].
+        self.decoded = 0
+        self.start = pos
+        self.pos = pos
+        self.bound = bisect.bisect_right(self.bounds, pos)
+        self.bucketSize = 0
+        self.hints = {}
+        self.quiet = False
+
+    def __len__ (self):
+        return self.count
+
+    def __iter__ (self):
+        for i in range(self.count):
+            yield self[i]
+
+    def __getitem__ (self, index):
+        if index < 0 or index >= self.count:
+            raise IndexError("shared string index out of range")
+        if self.strings[index] is not None:
+            return self.strings[index]
+        if index >= self.decoded and self.bucketSize > 0:
+            first = index - index % self.bucketSize
+            if first > self.decoded and first in self.hints and self.__decodeBucket(first):
+                return self.strings[index]
+        while self.decoded <= index:
+            text, self.pos, self.bound = self.__decode(self.pos, self.bound)
+            if self.strings[self.decoded] is None:
+                self.strings[self.decoded] = text
+            self.decoded += 1
+        return self.strings[index]
+
+    def __decodeBucket (self, first):
+        """Decode the bucket of strings that starts with string first, from
+its hint.  Return False, and drop all hints, if that fails or doesn't end
+right at the hint of the next bucket, or at the end of the record for the
+last bucket."""
+        pos = self.hints[first]
+        bound = bisect.bisect_right(self.bounds, pos)
+        last = min(first + self.bucketSize, self.count)
+        texts = []
+        self.quiet = True
+        try:
+            for i in range(first, last):
+                text, pos, bound = self.__decode(pos, bound)
+                texts.append(text)
+        except globals.ByteStreamError:
+            pos = None
+        finally:
+            self.quiet = False
+        if pos is None or pos != self.hints.get(last, self.bounds[-1]):
+            self.hints = {}
+            return False
+        for i, text in enumerate(texts, first):
+            if self.strings[i] is None:
+                self.strings[i] = text
+        return True
+
+    def __check (self, pos, length):
+        if pos + length > len(self.bytes):
+            if self.quiet:
+                raise globals.ByteStreamError()
+            globals.error("reading %d bytes from position %d would exceed the current size of %d\n"%
+                          (length, pos, len(self.bytes)))
+            raise globals.ByteStreamError()
+
+    def __decode (self, pos, bound):
+        """Decode the string at pos, with the next record boundary at
+self.bounds[bound].  Return the string, the position after it and the
+boundary after it."""
+        bytes = self.bytes
+        bounds = self.bounds
+        size = len(bytes)
+        if pos + 3 > size:
+            self.__check(pos, 3)
+        textLen, flags = SSTStringHeader.unpack_from(bytes, pos)
+        pos += 3
+        numElem = 0
+        if (flags & 0x08) > 0:
+            self.__check(pos, 2)
+            numElem = globals.unpackFrom(globals.UInt16, bytes, pos)
+            pos += 2
+        phoneticBytes = 0
+        if (flags & 0x04) > 0:
+            self.__check(pos, 4)
+            phoneticBytes = globals.unpackFrom(globals.UInt32, bytes, pos)
+            pos += 4
+        encoding = 'latin-1'
+        bytesPerChar = 1
+        if (flags & 0x01) > 0:
+            encoding = 'UTF-16LE'
+            bytesPerChar = 2
+
+        ret = globals.UnicodeRichExtText()
+        pieces = []
+        lastBound = len(bounds)
+        while textLen > 0:
+            while bound < lastBound and bounds[bound] <= pos:
+                bound += 1
+            if bound == lastBound:
+                self.__check(pos, textLen*bytesPerChar)
+                raise globals.ByteStreamError()
+            # a string is split into runs by CONTINUE record boundaries;
+            # compressed runs are latin-1, as their UTF-16 high bytes are
+            # all zero.
+            end = pos + textLen*bytesPerChar
+            if end > bounds[bound]:
+                end = bounds[bound]
+            if end > size:
+                self.__check(pos, end - pos)
+            pieces.append(bytes[pos:end].decode(encoding, 'replace'))
+            textLen -= (end - pos) // bytesPerChar
+            pos = end
+            if textLen > 0:
+                # a run after a boundary starts with its own flags byte.
+                self.__check(pos, 1)
+                if (globals.indexbytes(bytes, pos) & 0x01) > 0:
+                    encoding = 'UTF-16LE'
+                    bytesPerChar = 2
+                else:
+                    encoding = 'latin-1'
+                    bytesPerChar = 1
+                pos += 1
+        if len(pieces) == 1:
+            ret.baseText = pieces[0]
+        else:
+            ret.baseText = "".join(pieces)
+
+        # formatting runs
+        if numElem > 0:
+            self.__check(pos, numElem*4)
+            pos += numElem*4
+        if phoneticBytes > 0:
+            self.__check(pos, phoneticBytes)
+            ret.phoneticBytes = bytes[pos:pos + phoneticBytes]
+            pos += phoneticBytes
+        return ret, pos, bound
+
+    def setHints (self, bucketSize, offsets):
+        """Set the string offsets of an EXTSST record: offsets has the
+(ib, cbOffset) pair of every bucketSize-th string, the stream position of
+the string and its offset in the SST or CONTINUE record it starts in,
+header included.  If any of them is not inside that record, or not after
+the one before it, none is used."""
+        if bucketSize <= 0 or len(offsets) == 0 or offsets[0][1] != 12:
+            return
+        if (len(offsets) - 1)*bucketSize >= self.count:
+            return
+        # stream position of the SST record and of each CONTINUE record.
+        recordPos = offsets[0][0] - offsets[0][1]
+        recordStarts = [recordPos]
+        for i, bound in enumerate(self.bounds[:-1]):
+            recordStarts.append(recordPos + bound + 4*(i + 1))
+        hints = {}
+        prev = -1
+        for i, (streamPos, offset) in enumerate(offsets):
+            # each string has to start inside the record that the offset is
+            # relative to, after the strings of the bucket before it.
+            record = bisect.bisect_right(recordStarts, streamPos - offset) - 1
+            if record < 0 or recordStarts[record] != streamPos - offset or offset < 4:
+                return
+            recordOffset = 0
+            if record > 0:
+                recordOffset = self.bounds[record - 1]
+            pos = recordOffset + offset - 4
+            if pos <= prev or pos >= self.bounds[record]:
+                return
+            hints[i*bucketSize] = pos
+            prev = pos
+        if hints[0] != self.start:
+            return
+        self.bucketSize = bucketSize
+        self.hints = hints
+
+
 class SST(BaseRecordHandler):
 
     def __parseBytes (self):
         self.refCount = self.readSignedInt(4) # total number of references in workbook
         self.strCount = self.readSignedInt(4) # total number of unique strings.
-        self.sharedStrings = []
-        for i in range(0, self.strCount):
-            extText, bytesRead = globals.getUnicodeRichExtText(self.bytes, self.getCurrentPos(), self.roflist)
-            self.readBytes(bytesRead) # advance current position.
-            self.sharedStrings.append(extText)
+        self.sharedStrings = SharedStringTable(self.bytes, self.roflist, self.strCount, self.getCurrentPos())
 
     def parseBytes (self):
         self.__parseBytes()
+        sharedStrings = list(self.sharedStrings)
         self.appendLine("total number of references: %d"%self.refCount)
         self.appendLine("total number of unique strings: %d"%self.strCount)
         i = 0
-        for s in self.sharedStrings:
+        for s in sharedStrings:
             self.appendLine("s%d: %s"%(i, s.baseText))
             i += 1
 
     def fillModel (self, model):
         self.__parseBytes()
-        wbg = model.getWorkbookGlobal()
-        for sst in self.sharedStrings:
-            wbg.appendSharedString(sst)
+        model.getWorkbookGlobal().setSharedStrings(self.sharedStrings)
+
+
+class ExtSST(BaseRecordHandler):
+
+    def __parseBytes (self):
+        self.bucketSize = self.readUnsignedInt(2)
+        self.offsets = []
+        while self.getCurrentPos() + 8 <= self.size:
+            streamPos = self.readUnsignedInt(4)
+            offset = self.readUnsignedInt(2)
+            self.readUnsignedInt(2) # reserved
+            self.offsets.append((streamPos, offset))
+
+    def fillModel (self, model):
+        self.__parseBytes()
+        sharedStrings = model.getWorkbookGlobal().getSharedStrings()
+        if isinstance(sharedStrings, SharedStringTable):
+            sharedStrings.setHints(self.bucketSize, self.offsets)
 
 
 class Blank(BaseRecordHandler):
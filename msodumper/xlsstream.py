@@ -5,10 +5,12 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 from builtins import range
-import sys
-from . import ole, globals, xlsrecord
+import sys, struct, array, bisect, collections, functools
+from . import ole, globals, hexdump
 from .globals import output
 
+xlsrecord = globals.HandlerRegistry('xlsrecord')
+
 class EndOfStream(Exception): pass
 
 unusedRecDesc = "[unused, must be ignored]"
@@ -323,6 +325,34 @@ recDataRev = {
     0x0151: ["EONB*", "Change Track End of Nested Block"]
 }
 
+# opcode: handler of the records that are only used to fill the model; the
+# dumps show their raw bytes only.
+modelRecData = {
+    0x00FF: xlsrecord.ExtSST,
+}
+
+
+def parseOpcodes (text):
+    """Return the set of opcodes in text, separated by commas, each given as
+a number (0x0006 or 6) or as the canonical name of the record (FORMULA)."""
+    names = {}
+    for table in (recDataRev, recData):
+        for opcode, info in table.items():
+            names[info[0]] = opcode
+    opcodes = set()
+    for item in text.split(","):
+        item = item.strip()
+        if len(item) == 0:
+            continue
+        if item in names:
+            opcodes.add(names[item])
+            continue
+        try:
+            opcodes.add(int(item, 0))
+        except ValueError:
+            raise ValueError("unknown record: '%s'" % item)
+    return opcodes
+
 
 class StreamData(object):
     """run-time stream data."""
@@ -412,7 +442,7 @@ class XLStream(object):
         obj = self.__getDirectoryObj()
         bytes = []
         if obj != None:
-            bytes = obj.getRawStream(entry)
+            bytes = obj.getStreamView(entry)
         strm = XLDirStream(bytes, self.params, self.strmData)
         return strm
 
@@ -423,6 +453,127 @@ class DirType:
     PivotTableCache = 2
 
 
+# opcode and size of a BIFF record
+RecordHeader = struct.Struct('<HH')
+
+class RecordIndex(object):
+    """The records of a BIFF stream, found in one pass over their headers.
+
+The offset, opcode and size of each record are kept in parallel arrays, along
+with the number of the first record of its continuation group: a record and
+the CONTINUE records that follow it form one group.  The scan stops where
+XLDirStream stops reading: at a zero opcode, or at a record that doesn't end
+before the end of the stream."""
+
+    def __init__ (self, bytes):
+        self.offsets = array.array('Q')
+        self.opcodes = array.array('H')
+        self.sizes = array.array('H')
+        self.groups = array.array('L')
+        # opcode of the header where the scan stopped, None if there is no
+        # room for a header there.
+        self.stopOpcode = None
+        self.__scan(bytes)
+
+    def __scan (self, bytes):
+        if type(bytes) in globals.plainBufferTypes:
+            unpack = functools.partial(RecordHeader.unpack_from, bytes)
+        else:
+            unpack = functools.partial(bytes.unpack_from, RecordHeader)
+        addOffset, addOpcode = self.offsets.append, self.opcodes.append
+        addSize, addGroup = self.sizes.append, self.groups.append
+        end = len(bytes)
+        pos = 0
+        number = 0
+        group = 0
+        while end - pos >= 4:
+            opcode, size = unpack(pos)
+            if opcode == 0x0000 or pos + 4 + size >= end:
+                self.stopOpcode = opcode
+                return
+            if opcode != 0x003C or number == 0:
+                group = number
+            addOffset(pos)
+            addOpcode(opcode)
+            addSize(size)
+            addGroup(group)
+            number += 1
+            pos += 4 + size
+
+    def __len__ (self):
+        return len(self.offsets)
+
+    def find (self, pos):
+        """Return the number of the record at offset pos, or None."""
+        number = bisect.bisect_left(self.offsets, pos)
+        if number < len(self.offsets) and self.offsets[number] == pos:
+            return number
+        return None
+
+    def getGroupEnd (self, number):
+        """Return the number of the first record after the continuation group
+that starts with record number."""
+        end = number + 1
+        while end < len(self.groups) and self.groups[end] == number:
+            end += 1
+        return end
+
+    def isGroupComplete (self, end):
+        """Whether the group before record number end can be read: the
+stream has to go on with a record that is not a CONTINUE one."""
+        if end < len(self.offsets):
+            return True
+        return self.stopOpcode not in (None, 0x0000, 0x003C)
+
+    def getHistogram (self):
+        """Return the number of records by opcode."""
+        return collections.Counter(self.opcodes)
+
+
+class RecordFilter(object):
+    """Which records of a stream readRecord() dumps: the opcodes of
+params.includedRecords (all if it's empty) but not those of
+params.excludedRecords, in the sheets of params.selectedSheets (all if it's
+None).  Sheets are numbered in the order of their BOUNDSHEET records, and a
+sheet goes from the BOF its BOUNDSHEET points to up to the next sheet.  The
+workbook globals before the first sheet are always dumped."""
+
+    def __init__ (self, params, index, bytes):
+        self.included = params.includedRecords
+        self.excluded = params.excludedRecords
+        # record number ranges of the sheets that are not selected.
+        self.skipStarts = []
+        self.skipEnds = []
+        if params.selectedSheets is not None:
+            self.__findSkippedSheets(params.selectedSheets, index, bytes)
+
+    def __findSkippedSheets (self, selectedSheets, index, bytes):
+        starts = []
+        for number in range(len(index)):
+            if index.opcodes[number] != 0x0085 or index.sizes[number] < 4:
+                continue
+            sheetPos = globals.unpackFrom(globals.UInt32, bytes, index.offsets[number] + 4)
+            starts.append(index.find(sheetPos))
+        bounds = sorted(start for start in starts if start is not None) + [len(index)]
+        skipped = sorted((start, bounds[bisect.bisect_right(bounds, start)])
+                         for sheet, start in enumerate(starts)
+                         if start is not None and sheet not in selectedSheets)
+        self.skipStarts = [start for start, end in skipped]
+        self.skipEnds = [end for start, end in skipped]
+
+    def isEmpty (self):
+        return not self.included and not self.excluded and not self.skipStarts
+
+    def accepts (self, number, opcode):
+        """Whether the record with number and opcode in the index is dumped."""
+        if self.included and opcode not in self.included:
+            return False
+        if opcode in self.excluded:
+            return False
+        skip = bisect.bisect_right(self.skipStarts, number) - 1
+        return skip < 0 or number >= self.skipEnds[skip]
+
+
 class XLDirStream(object):
 
     def __init__ (self, bytes, params, strmData):
@@ -434,9 +585,29 @@ class XLDirStream(object):
         self.params = params
         self.strmData = strmData
 
+        self.__index = None
+        self.__record = 0
+        self.__filter = None
+
+    def index (self):
+        """Return the RecordIndex of the stream, built on first use."""
+        if self.__index is None:
+            self.__index = RecordIndex(self.bytes)
+        return self.__index
+
+    def seekRecord (self, number):
+        """Continue reading at the record with the given number in index()."""
+        self.pos = self.index().offsets[number]
+        self.__record = number
+
 
     def readRaw (self, size=1):
         # assume little endian
+        if size in globals.unsignedLayouts:
+            bytes = globals.unpackFrom(globals.unsignedLayouts[size], self.bytes, self.pos)
+            self.pos += size
+            return bytes
+
         bytes = 0
         for i in range(0, size):
             b = globals.indexbytes(self.bytes, self.pos)
@@ -458,34 +629,59 @@ class XLDirStream(object):
     def __printSep (self, c, w, prefix=''):
         globals.outputln(prefix + c*w)
 
-    def __readRecordBytes (self):
-        if self.size - self.pos < 4:
-            raise EndOfStream
+    def __getFilter (self):
+        if self.__filter is None:
+            self.__filter = RecordFilter(self.params, self.index(), self.bytes)
+        return self.__filter
 
-        pos = self.pos
-        header = self.readRaw(2)
-        if header == 0x0000:
+    def __findGroup (self):
+        '''Return the numbers of the first record of the next group of
+        records (a record and its CONTINUE blocks) and of the one after it.'''
+
+        index = self.index()
+        first = self.__record
+        if first >= len(index):
+            raise EndOfStream
+        end = index.getGroupEnd(first)
+        if not index.isGroupComplete(end):
             raise EndOfStream
-        size = self.readRaw(2)
-        bytes = self.readByteArray(size)
-        return pos, header, size, bytes
+        return first, end
 
-    def __readRecAndContBytes(self):
+    def __skipGroup (self, end):
+        index = self.index()
+        self.__record = end
+        self.pos = index.offsets[end-1] + 4 + index.sizes[end-1]
+
+    def __readRecAndContBytes(self, group=None):
         '''Read record itself and possible CONTINUE blocks.'''
 
-        pos, header, size, bytes = self.__readRecordBytes()
+        index = self.index()
+        if group is None:
+            group = self.__findGroup()
+        first, end = group
+
+        pos = index.offsets[first]
+        header = index.opcodes[first]
+        size = index.sizes[first]
+        bytes = self.bytes[pos+4:pos+4+size]
 
         # Records boundaries/offset list (only useful if there are
         # CONTINUE records)
         roflist = [size]
-        
-        # Read possible CONTINUE records, and concatenate the data
-        while self.peekNext() == 0x3c:
-            cpos, cheader, csize, cbytes = self.__readRecordBytes()
-            bytes += cbytes
-            size += csize
-            roflist.append(size)
 
+        # Concatenate the data of the CONTINUE records, at once: growing
+        # the data record by record would copy it again each time.
+        if end - first > 1:
+            pieces = [bytes]
+            for number in range(first + 1, end):
+                cpos = index.offsets[number]
+                csize = index.sizes[number]
+                pieces.append(self.bytes[cpos+4:cpos+4+csize])
+                size += csize
+                roflist.append(size)
+            bytes = b"".join(pieces)
+
+        self.__skipGroup(end)
         return pos, header, size, bytes, roflist
 
     def peekNext (self):
@@ -524,11 +720,13 @@ class XLDirStream(object):
     def fillModel (self, model):
         pos, header, size, bytes, roflist = self.__readRecAndContBytes()
         handler = self.__getRecordHandler(header, size, bytes, roflist)
+        if handler == None and header in modelRecData and not self.strmData.encrypted:
+            handler = modelRecData[header](header, size, bytes, self.strmData, roflist)
         if handler != None:
             try:
                 handler.fillModel(model)
             except Exception as e:
-                if not globals.params.catchExceptions:
+                if not globals.getContext().params.catchExceptions:
                     raise
                 globals.error("XLDirStream:fillModel: %s\n" % e)
         self.__postReadRecord(header)
@@ -539,7 +737,18 @@ class XLDirStream(object):
         return self.__getRecordHandler(header, size, bytes, roflist)
 
     def readRecord (self):
-        pos, header, size, bytes, roflist = self.__readRecAndContBytes()
+        group = self.__findGroup()
+        recordFilter = self.__getFilter()
+        if not recordFilter.isEmpty():
+            first, end = group
+            header = self.index().opcodes[first]
+            if not recordFilter.accepts(first, header):
+                # skip it without concatenating, parsing or formatting it.
+                self.__skipGroup(end)
+                self.__postReadRecord(header)
+                return header
+
+        pos, header, size, bytes, roflist = self.__readRecAndContBytes(group)
 
         # record handler that parses the raw bytes and displays more
         # meaningful information.
@@ -567,31 +776,21 @@ class XLDirStream(object):
             globals.outputln("%4.4Xh:   size = %d"%(header, size))
 
         # print the raw bytes, with 16 bytes per line.
-        self.__printSep('-', globals.OutputWidth-len(headerStr), headerStr)
-        lines = []
-        for i in range(0, size):
-            if i % 16 == 0:
-                lines.append([])
-            lines[-1].append(bytes[i])
-
-        for line in lines:
-            output("%4.4Xh: "%header)
-            n = len(line)
-            for byte in line:
-                output("%2.2X "%globals.indexedbytetoint(byte))
-            for i in range(n, 16):
-                output("   ")
-            output('  ')
-
-            for byte in line:
-                output(globals.toCharOrDot(byte))
-
-            globals.outputln("")
+        if globals.outputEnabled():
+            self.__printSep('-', globals.OutputWidth-len(headerStr), headerStr)
+            hexdump.dumpLabelledLines(bytes[0:size], output, "%4.4Xh: "%header)
 
+        name = None
+        if header in recData:
+            name = recData[header][0]
+        elif self.type == DirType.RevisionLog and header in recDataRev:
+            name = recDataRev[header][0]
+        globals.beginRecord(pos, header, name, size)
         if handler != None and not self.strmData.encrypted:
             # record handler exists.  Parse the record and display more info
             # unless the stream is encrypted.
             handler.output()
+        globals.endRecord()
 
         self.__postReadRecord(header)
         return header
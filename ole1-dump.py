@@ -5,7 +5,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 
-from msodumper import ole1record
+from msodumper import ole1record, globals
 import sys
 
 
@@ -28,6 +28,7 @@ def main(args):
 
 
 if __name__ == '__main__':
-    main(sys.argv)
+    with globals.OutputSink():
+        main(sys.argv)
 
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
@@ -13,12 +13,20 @@ def usage (exname):
     exname = os.path.basename(exname)
     msg = """Usage: %s [options] [ppt file]
 
+Use - as the file name to read the file from the standard input.
+
 Options:
   --help        displays this help message.
   --no-struct-output suppress normal structure analysis output
   --dump-text   extract and print the textual content
   --no-raw-dumps suppress raw hex dumps of uninterpreted areas
   --id-select=id1[,id2 ...] limit output to selected record Ids
+  --mmap        map the file into memory instead of reading it all at once
+  --list        only list the streams, reading just the header and directory
+  --json-lines  write one JSON object per record instead of the regular output
+  -o, --output=file
+                write the output to file, compressed if its name ends with
+                .gz, .bz2 or .xz
 """ % exname
     print(msg)
 
@@ -37,9 +45,8 @@ class PPTDumper(object):
         globals.outputln("-"*68)
 
     def dump (self):
-        file = open(self.filepath, 'rb')
-        strm = pptstream.PPTFile(file.read(), self.params)
-        file.close()
+        chars = ole.readFile(self.filepath, self.params.mmap)
+        strm = pptstream.PPTFile(chars, self.params)
         strm.printStreamInfo()
         strm.printHeader()
         strm.printDirectory()
@@ -84,29 +91,40 @@ def main (args):
         usage(exname)
         return
 
+    params = globals.getContext().params
+    output = None
     try:
-        opts, args = getopt.getopt(args, "h",
+        opts, args = getopt.getopt(args, "ho:",
                                    ["help", "debug", "show-sector-chain",
                                     "no-struct-output", "dump-text",
-                                    "id-select=", "no-raw-dumps"])
+                                    "id-select=", "no-raw-dumps", "mmap",
+                                    "list", "json-lines", "output="])
         for opt, arg in opts:
             if opt in ['-h', '--help']:
                 usage(exname)
                 return
             elif opt in ['--debug']:
-                globals.params.debug = True
+                params.debug = True
             elif opt in ['--show-sector-chain']:
-                globals.params.showSectorChain = True
+                params.showSectorChain = True
             elif opt in ['--no-struct-output']:
-                globals.params.noStructOutput = True
+                params.noStructOutput = True
             elif opt in ['--dump-text']:
-                globals.params.dumpText = True
+                params.dumpText = True
             elif opt in ['--no-raw-dumps']:
-                globals.params.noRawDumps = True
+                params.noRawDumps = True
+            elif opt in ['--mmap']:
+                params.mmap = True
+            elif opt in ['--list']:
+                params.list = True
+            elif opt in ['--json-lines']:
+                params.jsonLines = True
+            elif opt in ['-o', '--output']:
+                output = arg
             elif opt in ['--id-select']:
-                globals.params.dumpedIds = arg.split(",")
-                globals.params.dumpedIds = \
-                    set([int(val) for val in globals.params.dumpedIds if val])
+                params.dumpedIds = arg.split(",")
+                params.dumpedIds = \
+                    set([int(val) for val in params.dumpedIds if val])
             else:
                 error("unknown option %s\n"%opt)
                 usage()
@@ -116,13 +134,25 @@ def main (args):
         usage(exname)
         return
 
-    dumper = PPTDumper(args[0], globals.params)
-    if not dumper.dump():
-        error("FAILURE\n")
-    if globals.params.dumpText:
-        globals.dumptext()
+    with globals.OutputFile(output):
+        if params.list:
+            with ole.OleContainer(args[0], params) as container:
+                container.list()
+            return
+
+        dumper = PPTDumper(args[0], params)
+        if params.jsonLines:
+            with globals.JSONLinesOutput():
+                result = dumper.dump()
+        else:
+            result = dumper.dump()
+        if not result:
+            error("FAILURE\n")
+        if params.dumpText:
+            globals.dumptext()
 
 if __name__ == '__main__':
-    main(sys.argv)
+    with globals.OutputSink():
+        main(sys.argv)
 
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
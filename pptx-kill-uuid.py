@@ -15,18 +15,19 @@ import sys
 
 
 def main():
-    buf = sys.stdin.read()
+    pattern = re.compile(r"\{[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{12}\}")
+    # UUIDs are numbered in the order of their first occurrence.
+    numbers = {}
 
-    counter = 0
-    while True:
-        match = re.search("\{[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{12}\}", buf)
-        if not match:
-            break
+    def replace(match):
         uuid = match.group()
-        buf = buf.replace(uuid, str(counter))
-        counter += 1
+        if uuid not in numbers:
+            numbers[uuid] = str(len(numbers))
+        return numbers[uuid]
 
-    sys.stdout.write(buf)
+    # A UUID never spans lines, so the input can be filtered line by line.
+    for line in sys.stdin:
+        sys.stdout.write(pattern.sub(replace, line))
 
 
 if __name__ == "__main__":
@@ -41,6 +41,30 @@ class Test(unittest.TestCase):
                 if filename.endswith(".emf"):
                     self.dump(os.path.join(dirname, filename).replace('.emf', ''))
 
+    def test_header(self):
+        """Compares parts of a dump with the output of the dumper before these
+        structures were described by schemas."""
+        self.dump('pass/fdo31814-2')
+        emrHeader = self.root.find('emrHeader')
+        self.assertEqual('0x1', emrHeader.find('Type').attrib['value'])
+        self.assertEqual('108', emrHeader.find('Size').attrib['value'])
+        header = emrHeader.find('header')
+        bounds = header.find('Bounds')
+        self.assertEqual('RectL', bounds.attrib['type'])
+        self.assertEqual(['0', '2', '98', '89'], [bounds.find(i).attrib['value'] for i in ('Left', 'Top', 'Right', 'Bottom')])
+        self.assertEqual('0x464d4520', header.find('RecordSignature').attrib['value'])
+        self.assertEqual('ENHMETA_SIGNATURE', header.find('RecordSignature').attrib['name'])
+        self.assertEqual('0x10000', header.find('Version').attrib['value'])
+        self.assertEqual('15996', header.find('Bytes').attrib['value'])
+        self.assertEqual('461', header.find('Records').attrib['value'])
+        self.assertEqual('3', header.find('Handles').attrib['value'])
+        self.assertEqual('0', header.find('nPalEntries').attrib['value'])
+        self.assertEqual('1680', header.find('Device/cx').attrib['value'])
+
+        bitBlt = self.root.find('record[@index="457"]')
+        self.assertEqual('EMR_BITBLT', bitBlt.attrib['type'])
+        self.assertEqual(['0', '2'], [bitBlt.find('Bounds/' + i).attrib['value'] for i in ('Left', 'Top')])
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- encoding: UTF-8 -*-
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+import unittest
+import concurrent.futures
+import gzip
+import io
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+sys.path.append(sys.path[0] + "/../..")
+doc_dumper = __import__('doc-dump')
+globals = __import__('msodumper.globals').globals
+binarystream = __import__('msodumper.binarystream').binarystream
+
+
+class Test(unittest.TestCase):
+    def test_output_sink(self):
+        target = io.BytesIO()
+        stdout = sys.stdout
+        with globals.OutputSink(target, bufferSize=8):
+            print('<a/>')
+            globals.outputln(b'b\xc3\xa9')
+            globals.output('\u0151\n')
+            self.assertIsNot(stdout, sys.stdout)
+        self.assertIs(stdout, sys.stdout)
+        self.assertEqual('<a/>\nbé\nő\n', target.getvalue().decode('utf-8'))
+
+    def test_output_file(self):
+        target = io.BytesIO()
+        params = globals.Params()
+        with globals.DumpContext(params, globals.OutputSink(target)):
+            doc_dumper.DOCDumper("../doc/hello.doc", params).dump()
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'hello.xml.gz')
+            doc_dumper.main(["doc-dump", "--output", path, "../doc/hello.doc"])
+            with gzip.open(path, 'rb') as stream:
+                self.assertEqual(target.getvalue(), stream.read())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_dump_context(self):
+        def dump(name):
+            target = io.BytesIO()
+            params = globals.Params()
+            with globals.DumpContext(params, globals.OutputSink(target)):
+                doc_dumper.DOCDumper("../doc/%s.doc" % name, params).dump()
+            return target.getvalue()
+        names = ['hello', 'unicode', 'charprops', 'escape'] * 2
+        expected = [dump(name) for name in names]
+        self.assertTrue(expected[0].startswith(b'<?xml'))
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            self.assertEqual(expected, list(executor.map(dump, names)))
+
+        # The catch flag of the current context applies, not the default one.
+        params = globals.Params()
+        params.catchExceptions = True
+        with globals.DumpContext(params):
+            self.assertEqual(0, globals.getUnicodeRichExtText(b'')[1])
+        self.assertRaises(globals.ByteStreamError, globals.getUnicodeRichExtText, b'')
+
+    def test_get_string(self):
+        stream = binarystream.BinaryStream('a<b\0'.encode('utf-16-le'))
+        with globals.DumpContext() as context:
+            value = stream.readString()
+            self.assertIn('&lt;', value)
+            self.assertEqual(8, stream.pos)
+            self.assertEqual([value], list(context.stringCache.values()))
+        self.assertEqual({}, globals.getContext().stringCache)
+
+        # An unterminated string raises struct.error and doesn't move.
+        stream = binarystream.BinaryStream('abc'.encode('utf-16-le'))
+        self.assertRaises(struct.error, stream.readString)
+        self.assertEqual(0, stream.pos)
+        self.assertEqual(binarystream.BinaryStream('ab\0'.encode('utf-16-le')).getString(), stream.readString(2))
+
+    def test_schema_truncated(self):
+        schema = binarystream.Schema([binarystream.Field("a", "H"), binarystream.Field("b", "H")])
+        stream = binarystream.BinaryStream(b'\x01\x00\x02')
+        target = io.BytesIO()
+        with globals.OutputSink(target):
+            # The fields before the end are still printed.
+            self.assertRaises(struct.error, schema.readAndDump, stream)
+        self.assertIn(b'<a value="0x1"/>', target.getvalue())
+        self.assertNotIn(b'<b ', target.getvalue())
+        self.assertEqual(2, stream.pos)
+
+    def test_json_lines(self):
+        target = io.BytesIO()
+        params = globals.Params()
+        with globals.DumpContext(params, globals.OutputSink(target)):
+            with globals.JSONLinesOutput():
+                doc_dumper.DOCDumper("../doc/hello.doc", params).dump()
+        records = [json.loads(line) for line in target.getvalue().decode('utf-8').splitlines()]
+        self.assertEqual('WordDocumentStream', records[0]['name'])
+        self.assertEqual(42476, records[0]['fields']['wIdent'])
+        self.assertIsNone(globals.getContext().jsonl)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- encoding: UTF-8 -*-
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+import unittest
+import io
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import sys
+sys.path.append(sys.path[0] + "/../..")
+globals = __import__('msodumper.globals').globals
+ole = __import__('msodumper.ole').ole
+
+# A small compound document with 5 streams.
+hello = '../doc/hello.doc'
+
+
+class Test(unittest.TestCase):
+    def test_mmap(self):
+        """Makes sure that mapping the file gives the same bytes as reading it."""
+
+        expected = ole.readFile(hello)
+        actual = ole.readFile(hello, useMmap=True)
+        self.assertIsInstance(actual, memoryview)
+        self.assertEqual(expected, bytes(actual))
+
+        params = globals.Params()
+        params.mmap = True
+        with ole.OleContainer(hello, params) as container:
+            with ole.OleContainer(hello, globals.Params()) as expectedContainer:
+                self.assertEqual(bytes(expectedContainer.getStreamForName('WordDocument')),
+                                 bytes(container.getStreamForName('WordDocument')))
+
+    def test_index(self):
+        with ole.OleContainer(hello, globals.Params()) as container:
+            names = [node.getHierarchicalName() for node in container.walk()]
+            self.assertEqual('', names[0])
+            self.assertIn('WordDocument', names)
+            self.assertTrue(container.exists('WordDocument'))
+            self.assertFalse(container.exists('NoSuchStream'))
+            node = container.getNode('WordDocument')
+            self.assertEqual(node.Entry.StreamSize, len(container.getStreamForName('WordDocument')))
+
+    def test_scan(self):
+        header = ole.scanFile(hello, globals.Params())
+        names = header.getDirectory().getDirectoryNames()
+        self.assertIn(b'WordDocument', names)
+        # Only the header, one SAT sector and the directory are read.
+        self.assertLess(header.bytes.bytesRead, os.path.getsize(hello) // 4)
+        header.close()
+        self.assertTrue(header.bytes.file.closed)
+
+    def test_list(self):
+        target = io.BytesIO()
+        with ole.OleContainer(hello, globals.Params()) as container:
+            with globals.OutputSink(target):
+                container.list()
+        self.assertIn(b'   \\x05SummaryInformation\n', target.getvalue())
+        self.assertNotIn(b'\x05', target.getvalue())
+
+    def test_extract_all(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with ole.OleContainer(hello, globals.Params()) as container:
+                self.assertEqual(5, container.extractAll(directory))
+                with open(os.path.join(directory, 'WordDocument'), 'rb') as stream:
+                    self.assertEqual(bytes(container.getStreamForName('WordDocument')), stream.read())
+            self.assertTrue(os.path.exists(os.path.join(directory, '\\x01CompObj')))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_extract_all_same_name(self):
+        """Streams whose escaped names are the same are written to different
+        files."""
+        with open(hello, 'rb') as stream:
+            chars = bytearray(stream.read())
+        # Rename 1Table to the escaped form of the name of \x01CompObj.
+        name = '\\x01CompObj'.encode('utf-16-le')
+        pos = chars.find('1Table'.encode('utf-16-le'))
+        chars[pos:pos + 64] = name + b'\0' * (64 - len(name))
+        chars[pos + 64:pos + 66] = struct.pack('<H', len(name) + 2)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'same-name.doc')
+            with open(path, 'wb') as stream:
+                stream.write(chars)
+            with ole.OleContainer(path, globals.Params()) as container:
+                self.assertEqual(5, container.extractAll(os.path.join(directory, 'streams')))
+                names = sorted(os.listdir(os.path.join(directory, 'streams')))
+                self.assertEqual(['WordDocument', '\\x01CompObj', '\\x01CompObj~1'], [i for i in names if 'Summary' not in i])
+                contents = []
+                for i in ('\\x01CompObj', '\\x01CompObj~1'):
+                    with open(os.path.join(directory, 'streams', i), 'rb') as stream:
+                        contents.append(stream.read())
+                self.assertEqual(sorted([bytes(container.getStreamForName('\x01CompObj')), bytes(container.getStreamForName('\\x01CompObj'))]),
+                                 sorted(contents))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_extract_truncated_root(self):
+        """Short streams are extracted right when the chain of the root storage
+        runs outside of the file."""
+        with open(hello, 'rb') as stream:
+            chars = bytearray(stream.read())
+        header = ole.Header(bytes(chars), globals.Params())
+        header.parse()
+        directory = header.getDirectory()
+        directory.parseDirEntries()
+        rootID = directory.entries[0].StreamSectorID
+        self.assertEqual([rootID], header.getSAT().getSectorIDChain(rootID))
+        # Let the root storage continue in a sector after the end of the file.
+        pos = 512 + header.getMSAT().secIDs[0] * 512 + rootID * 4
+        chars[pos:pos + 4] = struct.pack('<i', len(chars) // 512 + 10)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'truncated.doc')
+            with open(path, 'wb') as stream:
+                stream.write(chars)
+            with ole.OleContainer(path, globals.Params()) as container:
+                self.assertEqual(5, container.extractAll(os.path.join(directory, 'streams')))
+                with open(os.path.join(directory, 'streams', '\\x01CompObj'), 'rb') as stream:
+                    self.assertEqual(bytes(container.getStreamForName('\x01CompObj')), stream.read())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_check(self):
+        with open(hello, 'rb') as stream:
+            chars = bytearray(stream.read())
+        header = ole.Header(bytes(chars), globals.Params())
+        header.parse()
+        self.assertEqual([], ole.Checker(header, globals.Params()).check())
+
+        # Make the directory chain loop back to its first sector.
+        dirID = header.getFirstSectorID(ole.BlockType.Directory)
+        pos = 512 + header.getMSAT().secIDs[0] * 512 + dirID * 4
+        chars[pos:pos + 4] = struct.pack('<i', dirID)
+        header = ole.Header(bytes(chars), globals.Params())
+        header.parse()
+        problems = ole.Checker(header, globals.Params()).check()
+        self.assertIn(ole.Checker.Problem.Cycle, [problem for problem, msg in problems])
+
+        # A negative SAT sector ID in the MSAT is reported, not taken from the end.
+        chars = bytearray(chars)
+        chars[80:84] = struct.pack('<i', -3)
+        header = ole.Header(bytes(chars), globals.Params())
+        header.parse()
+        problems = ole.Checker(header, globals.Params()).check()
+        self.assertIn((ole.Checker.Problem.InvalidID, "SAT: sector -3 is not in the allocation table"), problems)
+
+    def test_truncated_sat(self):
+        # The second SAT sector is cut in the middle of its third entry.
+        chars = struct.pack('<4i', 1, -2, -3, -1) + b'\0' * 496 + struct.pack('<2i', 5, 6) + b'\1\1'
+        sat = ole.SAT(512, chars, globals.Params())
+        sat.addSector(-1)
+        sat.addSector(0)
+        sat.buildArray()
+        self.assertEqual(4, sat.array.itemsize)
+        self.assertEqual(256, len(sat.array))
+        self.assertEqual([1, -2, -3, -1], list(sat.array[0:4]))
+        self.assertEqual([5, 6], list(sat.array[128:130]))
+        # The missing entries end their chains instead of leading to sector 0.
+        self.assertEqual([-2] * 126, list(sat.array[130:]))
+
+    def test_pipe(self):
+        with open(hello, 'rb') as stream:
+            expected = stream.read()
+        pipe = subprocess.Popen(['cat', hello], stdout=subprocess.PIPE)
+        self.assertEqual(expected, bytes(ole.readFile(pipe.stdout)))
+        pipe.stdout.close()
+        pipe.wait()
+        pipe = subprocess.Popen(['cat', hello], stdout=subprocess.PIPE)
+        header = ole.scanFile(pipe.stdout, globals.Params())
+        self.assertIn(b'WordDocument', header.getDirectory().getDirectoryNames())
+        header.close()
+        # The pipe was passed in, so it is left open.
+        self.assertFalse(pipe.stdout.closed)
+        pipe.stdout.close()
+        pipe.wait()
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
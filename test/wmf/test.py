@@ -41,6 +41,23 @@ class Test(unittest.TestCase):
                 if filename.endswith(".wmf"):
                     self.dump(os.path.join(dirname, filename).replace('.wmf', ''))
 
+    def test_type_detection(self):
+        """Compares parts of a dump with the output of an earlier version of the
+        dumper."""
+        self.dump('pass/TypeDetectionExample')
+        placeable = self.root.find('wmfHeader/placeableHeader')
+        self.assertEqual('0x9ac6cdd7', placeable.find('Key').attrib['value'])
+        self.assertEqual(['0', '0', '124', '124'], [placeable.find('BoundingBox/' + i).attrib['value'] for i in ('Left', 'Top', 'Right', 'Bottom')])
+        self.assertEqual('1200', placeable.find('Inch').attrib['value'])
+        self.assertEqual('0x53a1', placeable.find('Checksum').attrib['value'])
+        header = self.root.find('wmfHeader/header')
+        self.assertEqual('MEMORYMETAFILE', header.find('FileType').attrib['name'])
+        self.assertEqual('145', header.find('FileSize').attrib['value'])
+        self.assertEqual('4', header.find('NumObjects').attrib['value'])
+        records = self.root.findall('record')
+        self.assertEqual(['META_SETWINDOWEXT', 'META_SETWINDOWORG', 'META_SETMAPMODE'], [i.attrib['type'] for i in records[:3]])
+        self.assertEqual('124', records[0].find('setwindoworg/X').attrib['value'])
+
 if __name__ == '__main__':
     unittest.main()
 
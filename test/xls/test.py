@@ -6,16 +6,162 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 
-import sys
-sys.path.append(sys.path[0]+"/../..")
-xls_dumper = __import__('xls-dump')
 import unittest
+import io
 import os
+import struct
+import sys
+sys.path.append(sys.path[0] + "/../..")
+xls_dumper = __import__('xls-dump')
+globals = __import__('msodumper.globals').globals
+node = __import__('msodumper.node').node
+xlsmodel = __import__('msodumper.xlsmodel').xlsmodel
+xlsrecord = __import__('msodumper.xlsrecord').xlsrecord
+xlsstream = __import__('msodumper.xlsstream').xlsstream
+
 
 class Test(unittest.TestCase):
 
-    def test_foo (self):
-        self.assertEqual(1+1, 2)
+    def test_foo(self):
+        self.assertEqual(1 + 1, 2)
+
+    def test_node_attrs(self):
+        elem = node.Element('cell', {'b': 1})
+        elem.setAttr('a', 2)
+        elem.setAttr('b', 3)
+        self.assertEqual(3, elem.getAttr('b'))
+        self.assertTrue(elem.hasAttr('a'))
+        self.assertIsNone(elem.getAttr('c'))
+        self.assertEqual({'a': 2, 'b': 3}, elem.attrs)
+        self.assertEqual(0, len(elem.getChildNodes()))
+        self.assertFalse(hasattr(elem, '__dict__'))
+
+    def test_xml_writer(self):
+        docroot = node.Root()
+        root = docroot.appendElement('xls-dump')
+        sheet = root.appendElement('worksheet')
+        sheet.setAttr('name', 'a<b')
+        row = sheet.appendElement('row')
+        row.setAttr('id', 0)
+        row.appendElement('number-cell').setAttr('value', 1.5)
+        sheet.appendElement('shapes')
+        root.appendElement('text').appendContent('x & y')
+        expected = io.StringIO()
+        node.prettyPrint(expected, docroot)
+
+        actual = io.StringIO()
+        writer = node.XMLWriter(actual, bufferSize=2)
+        writer.startElement('xls-dump')
+        writer.startElement('worksheet', {'name': 'a<b'})
+        writer.startElement('row', {'id': 0})
+        writer.appendNode(node.Element('number-cell', {'value': 1.5}))
+        writer.endElement()
+        writer.startElement('shapes')
+        writer.endElement()
+        writer.endElement()
+        writer.appendNode(root.getChildNodes()[-1])
+        writer.close()
+        self.assertEqual(expected.getvalue(), actual.getvalue())
+
+    def test_record_index(self):
+        def record(opcode, data):
+            return struct.pack('<HH', opcode, len(data)) + data
+        bytes = record(0x0809, b'\0' * 16) + record(0x00FC, b'ab') + record(0x003C, b'cde') + \
+            record(0x000A, b'') + b'\0' * 8
+        index = xlsstream.RecordIndex(bytes)
+        self.assertEqual([0x0809, 0x00FC, 0x003C, 0x000A], list(index.opcodes))
+        self.assertEqual([0, 20, 26, 33], list(index.offsets))
+        self.assertEqual([0, 1, 1, 3], list(index.groups))
+        self.assertEqual(3, index.getGroupEnd(1))
+        self.assertEqual(2, index.find(26))
+        self.assertIsNone(index.find(27))
+        self.assertEqual(1, index.getHistogram()[0x003C])
+        # the stream ends with zeros after EOF, which is not read then.
+        self.assertFalse(index.isGroupComplete(4))
+
+        strm = xlsstream.XLDirStream(bytes, None, xlsstream.StreamData())
+        strm.seekRecord(1)
+        handler = strm.getNextRecordHandler()
+        self.assertEqual(b'abcde', handler.bytes)
+        self.assertEqual([2, 5], handler.roflist)
+        self.assertEqual(33, strm.pos)
+        self.assertRaises(xlsstream.EndOfStream, strm.getNextRecordHandler)
+
+    def test_record_filter(self):
+        def record(opcode, data):
+            return struct.pack('<HH', opcode, len(data)) + data
+        bof = record(0x0809, b'\0' * 16)
+        # globals with two BOUNDSHEET records, then the two sheets.
+        bytes = bof + record(0x0085, struct.pack('<L', 40)) + record(0x0085, struct.pack('<L', 69)) + record(0x000A, b'')
+        bytes += bof + record(0x0006, b'a') + record(0x000A, b'')
+        bytes += bof + record(0x00FD, b'b') + record(0x000A, b'') + bof
+        index = xlsstream.RecordIndex(bytes)
+        self.assertEqual(4, index.find(40))
+        self.assertEqual({0x0006, 0x00FD}, xlsstream.parseOpcodes('FORMULA, 0xfd'))
+        self.assertRaises(ValueError, xlsstream.parseOpcodes, 'NOSUCHRECORD')
+
+        params = globals.Params()
+        params.selectedSheets = {1}
+        recordFilter = xlsstream.RecordFilter(params, index, bytes)
+        self.assertEqual([True] * 4 + [False] * 3 + [True] * 3,
+                         [recordFilter.accepts(number, index.opcodes[number]) for number in range(len(index))])
+        params.includedRecords = {0x00FD}
+        recordFilter = xlsstream.RecordFilter(params, index, bytes)
+        self.assertEqual([8], [number for number in range(len(index)) if recordFilter.accepts(number, index.opcodes[number])])
+
+    def test_shared_string_table(self):
+        strings = [struct.pack('<HB', 3, 0) + b's%02d' % i for i in range(10)]
+        # 'é' in UTF-16, split by a CONTINUE record that switches to compressed characters.
+        strings.append(struct.pack('<HB', 2, 1) + b'\xe9\x00' + b'\x00' + b'\xe9')
+        bytes = struct.pack('<ll', 11, 11) + b''.join(strings)
+        table = xlsrecord.SharedStringTable(bytes, [38, 73, len(bytes)], 11, 8)
+        # EXTSST offsets of strings 0, 4 and 8, with the SST record at stream position 20.
+        table.setHints(4, [(32, 12), (56, 36), (84, 22)])
+        self.assertEqual({0: 8, 4: 32, 8: 56}, table.hints)
+        self.assertEqual('s09', table[9].baseText)
+        self.assertEqual(0, table.decoded)
+        self.assertEqual(['s%02d' % i for i in range(10)] + ['\xe9\xe9'], [s.baseText for s in table])
+        self.assertRaises(IndexError, table.__getitem__, 11)
+
+        # A corrupt EXTSST that points one byte into string 8 is dropped when
+        # the bucket doesn't end at the end of the record.
+        table = xlsrecord.SharedStringTable(bytes, [38, 73, len(bytes)], 11, 8)
+        table.setHints(4, [(32, 12), (56, 36), (85, 23)])
+        self.assertEqual({0: 8, 4: 32, 8: 57}, table.hints)
+        self.assertEqual('s09', table[9].baseText)
+        self.assertEqual({}, table.hints)
+        self.assertEqual(10, table.decoded)
+        self.assertEqual(['s%02d' % i for i in range(10)] + ['\xe9\xe9'], [s.baseText for s in table])
+
+        # An offset past the end of its record makes the whole EXTSST unused.
+        table = xlsrecord.SharedStringTable(bytes, [38, 73, len(bytes)], 11, 8)
+        table.setHints(4, [(32, 12), (62, 42), (84, 22)])
+        self.assertEqual({}, table.hints)
+        self.assertEqual('s09', table[9].baseText)
+        self.assertEqual(10, table.decoded)
+        self.assertEqual(['s%02d' % i for i in range(10)] + ['\xe9\xe9'], [s.baseText for s in table])
+
+    def test_cell_store(self):
+        sheet = xlsmodel.Worksheet(0)
+        sheet.setNumberCell(1, 2, 1.0, 15)
+        sheet.setNumberCell(0, 0, 2.0, 15)
+        sheet.setFormulaCell(0, 2, None, 3.0, 15)
+        sheet.setLastFormulaResult('three')
+        # A cell that is set again keeps its position in the row.
+        sheet.setNumberCell(1, 2, 4.0, 16)
+        self.assertEqual(4, len(sheet.getCells()))
+        rows = [(row.getAttr('id'), [(cell.name, cell.getAttr('col')) for cell in row.getChildNodes()])
+                for row in sheet.createDOM(None).getChildNodes() if row.name == 'row']
+        self.assertEqual([(0, [('number-cell', 0)]), (2, [('number-cell', 1), ('formula-cell', 0)])], rows)
+        cells = sheet.getCells()
+        self.assertEqual([(1.0, 15), (4.0, 16)], [(cells.getCell(i).value, cells.getCell(i).xfIdx) for i in (0, 3)])
+        self.assertEqual('three', cells.getCell(2).cachedResult)
+
+        # A cell without an XF index keeps None.
+        sheet.setLabelCell(3, 0, 5, None)
+        self.assertIsNone(sheet.getCells().getCell(4).xfIdx)
+        self.assertEqual(5, sheet.getCells().getCell(4).strID)
+
 
 if __name__ == '__main__':
     unittest.main()
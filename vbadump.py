@@ -434,33 +434,26 @@ class DirStreamReader( globals.ByteStream ):
                     self.readBytes(size)
 
 class VBAContainer:
-    def __init__( self, root ):
+    def __init__( self, container, root=None ):
         # we'll take a storage DirNode
         # and try and find the VBA container
         # relative to that. That way we should
         # be able to cater for the normal 'word' or
         # 'excel' compound documents or indeed any arbitrary
         # storage that contains a 'VBA' sub-folder
+        self.container = container
+        if root == None:
+            root = container.getRoot()
         self.oleRoot = root
         self.vbaRoot = None
 
-    def __findNodeByHierarchicalName( self, node, name ):
-        if ( node.getHierarchicalName() == name ):
-            return node
-        else:
-            for child in node.getChildren():
-                result = self.__findNodeByHierarchicalName( child, name )
-                if result != None:
-                    return result
-        return None
+    def __findNodeByHierarchicalName( self, name ):
+        return self.container.getNode( name )
 
     def __findNodeContainingLeafName( self, parentNode, name ):
-        for child in parentNode.getChildren():
-            if name == child.Entry.Name:
-                return parentNode
-            node = self.__findNodeContainingLeafName( child, name )
-            if node != None:
-                return node
+        for node in self.container.walk( parentNode ):
+            if node is not parentNode and node.getLeafName() == name:
+                return self.container.getNode( node.getParentName() )
         return None
 
     def findVBARoot(self):
@@ -474,7 +467,7 @@ class VBAContainer:
             exit(1)
         # need to read the dir stream
         dirName = self.vbaRoot.getHierarchicalName() + "VBA/dir"
-        dirNode = self.__findNodeByHierarchicalName( self.vbaRoot, dirName )
+        dirNode = self.__findNodeByHierarchicalName( dirName )
         if dirNode != None:
             #decompress
             bytes = dirNode.getStream()
@@ -489,16 +482,16 @@ class VBAContainer:
                 if child.isStorage() == False:
                     bytes = child.getStream()
                     print("")
-                    print("============ %s Stream size: 0x%x bytes)============"%(child.getName(), len(bytes)))
+                    print("============ %s Stream size: 0x%x bytes)============"%(child.getLeafName(), len(bytes)))
                     print("")
-                    if child.getName() == "PROJECT":
+                    if child.getLeafName() == "PROJECT":
                         #straight text file
                         print("%s"%bytes.decode(reader.codepageName))
                     else:
                         globals.dumpBytes( bytes, 512)
             for module in reader.Modules:
                 fullStreamName = self.vbaRoot.getHierarchicalName() + "VBA/" + module.streamname
-                moduleNode = self.__findNodeByHierarchicalName( self.vbaRoot, fullStreamName )
+                moduleNode = self.__findNodeByHierarchicalName( fullStreamName )
                 bytes = moduleNode.getStream()
                 print("============ %s Stream (inflated) size: 0x%x bytes offset: 0x%x ============"%(module.streamname,len(bytes), module.offset) )
                 compressed = vbahelper.CompressedVBAStream( bytes, module.offset )
@@ -511,25 +504,26 @@ class VBAContainer:
 
 def main():
     parser = optparse.OptionParser()
+    parser.add_option("--mmap", action="store_true", dest="mmap", default=False,
+        help="Map the file into memory instead of reading it all at once.")
 
     if ( len ( sys.argv ) <= 1 ):
         print("usage: vbadump: file")
         sys.exit(1)
-    # prepare for supporting more options
     options, args = parser.parse_args()
 
     params = globals.Params()
+    params.mmap = options.mmap
 
-    container = ole.OleContainer( args[ 0 ], params )
-
-    container.read()
-    root = container.getRoot()
-    vba = VBAContainer( root )
-    vba.dump()
+    with ole.OleContainer( args[ 0 ], params ) as container:
+        container.read()
+        vba = VBAContainer( container )
+        vba.dump()
 
     exit(0)
 
 if __name__ == '__main__':
-    main()
+    with globals.OutputSink():
+        main()
 
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
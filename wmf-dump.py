@@ -23,6 +23,10 @@ class WMFDumper:
 
 def main():
     parser = optparse.OptionParser()
+    parser.add_option("--json-lines", action="store_true", dest="json_lines", default=False,
+                      help="Write one JSON object per record (JSON Lines) instead of the regular output.")
+    parser.add_option("-o", "--output", dest="output", default=None, metavar="FILE",
+                      help="Write the output to FILE, compressed if its name ends with .gz, .bz2 or .xz.")
     options, args = parser.parse_args()
 
     if len(args) < 1:
@@ -30,11 +34,17 @@ def main():
         parser.print_help()
         sys.exit(1)
 
-    dumper = WMFDumper(args[0])
-    dumper.dump()
+    with globals.OutputFile(options.output):
+        dumper = WMFDumper(args[0])
+        if options.json_lines:
+            with globals.JSONLinesOutput():
+                dumper.dump()
+        else:
+            dumper.dump()
 
 
 if __name__ == '__main__':
-    main()
+    with globals.OutputSink():
+        main()
 
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab:
@@ -7,11 +7,30 @@
 from builtins import range
 import sys, os.path, optparse
 
-from msodumper import ole, xlsstream, globals, node, xlsmodel, olestream
-from msodumper import xlsparser, msocrypto
+from msodumper import ole, xlsstream, globals, olestream
+
+node = globals.LazyModule('node')
+xlsmodel = globals.LazyModule('xlsmodel')
+xlsparser = globals.LazyModule('xlsparser')
+msocrypto = globals.LazyModule('msocrypto')
 
 from msodumper.globals import error
 
+def parseSheets (text):
+    """Return the set of sheet numbers in text, separated by commas, each
+a number or a range like 1-3."""
+    sheets = set()
+    for item in text.split(","):
+        first, sep, last = item.partition("-")
+        try:
+            if sep:
+                sheets.update(range(int(first), int(last) + 1))
+            elif item.strip():
+                sheets.add(int(item))
+        except ValueError:
+            raise ValueError("invalid sheet number: '%s'" % item)
+    return sheets
+
 def equalsName (name, array):
     if len(name) != len(array):
         return False
@@ -54,10 +73,9 @@ class XLDumper(object):
         globals.outputln("-"*globals.OutputWidth)
 
     def __parseFile (self):
-        file = open(self.filepath, 'rb')
         self.strmData = xlsstream.StreamData()
-        self.strm = xlsstream.XLStream(file.read(), self.params, self.strmData)
-        file.close()
+        chars = ole.readFile(self.filepath, self.params.mmap)
+        self.strm = xlsstream.XLStream(chars, self.params, self.strmData)
 
     def dumpXML (self):
         self.__parseFile()
@@ -78,8 +96,8 @@ class XLDumper(object):
 
     def dumpCanonicalXML (self):
         self.__parseFile()
-        docroot = node.Root()
-        root = docroot.appendElement('xls-dump')
+        writer = node.XMLWriter(globals.utfwriter(), utf8 = self.params.utf8)
+        writer.startElement('xls-dump')
 
         dirEntries = self.strm.getDirectoryEntries()
         for entry in dirEntries:
@@ -91,9 +109,9 @@ class XLDumper(object):
             dirstrm = self.strm.getDirectoryStream(entry)
             wbmodel = self.__buildWorkbookModel(dirstrm)
             wbmodel.encrypted = self.strmData.encrypted
-            root.appendChild(wbmodel.createDOM())
+            wbmodel.writeXML(writer)
 
-        node.prettyPrint(globals.utfwriter(), docroot, utf8 = self.params.utf8)
+        writer.close()
 
     def dump (self):
         self.__parseFile()
@@ -212,33 +230,68 @@ def main ():
         help="Catch exceptions and try to continue.")
     parser.add_option("--utf-8", action="store_true", dest="utf8", default=False,
         help="Output strings as UTF-8.")
+    parser.add_option("--mmap", action="store_true", dest="mmap", default=False,
+        help="Map the file into memory instead of reading it all at once.")
+    parser.add_option("-l", "--list", action="store_true", dest="list", default=False,
+        help="Only list the streams of the file, reading just its header and directory.")
+    parser.add_option("--json-lines", action="store_true", dest="json_lines", default=False,
+        help="Write one JSON object per record (JSON Lines) instead of the regular output.  Implies the flat dump mode.")
+    parser.add_option("-o", "--output", dest="output", default=None, metavar="FILE",
+        help="Write the output to FILE, compressed if its name ends with .gz, .bz2 or .xz.")
+    parser.add_option("--include", dest="include", default="", metavar="RECORDS",
+        help="Only dump the records given by opcode (0x0006) or name (FORMULA), separated by commas.  Flat dump mode only.")
+    parser.add_option("--exclude", dest="exclude", default="", metavar="RECORDS",
+        help="Don't dump the records given by opcode or name, separated by commas.  Flat dump mode only.")
+    parser.add_option("--sheets", dest="sheets", default=None, metavar="SHEETS",
+        help="Only dump these sheets, numbered from 0 in the order of the BOUNDSHEET records, as numbers or ranges like 1-3 separated by commas.  The workbook globals are always dumped.  Flat dump mode only.")
     options, args = parser.parse_args()
-    params = globals.params
+    params = globals.getContext().params
     params.debug = options.debug
     params.showSectorChain = options.show_sector_chain
     params.showStreamPos = options.show_stream_pos
     params.catchExceptions = options.catch_exceptions
     params.utf8 = options.utf8
-    
-    if len(args) < 1:
-        globals.error("takes at least one argument\n")
+    params.mmap = options.mmap
+    params.jsonLines = options.json_lines
+    try:
+        params.includedRecords = xlsstream.parseOpcodes(options.include)
+        params.excludedRecords = xlsstream.parseOpcodes(options.exclude)
+        if options.sheets is not None:
+            params.selectedSheets = parseSheets(options.sheets)
+    except ValueError as e:
+        error("%s\n" % e)
         parser.print_help()
         sys.exit(1)
 
-    dumper = XLDumper(args[0], params)
-    if options.dump_mode == 'flat':
-        dumper.dump()
-    elif options.dump_mode == 'xml':
-        dumper.dumpXML()
-    elif options.dump_mode == 'canonical-xml' or options.dump_mode == 'cxml':
-        dumper.dumpCanonicalXML()
-    else:
-        error("unknown dump mode: '%s'\n"%options.dump_mode)
+    if len(args) < 1:
+        globals.error("takes at least one argument\n")
         parser.print_help()
         sys.exit(1)
 
+    with globals.OutputFile(options.output):
+        if options.list:
+            with ole.OleContainer(args[0], params) as container:
+                container.list()
+            return
+
+        dumper = XLDumper(args[0], params)
+        if params.jsonLines:
+            with globals.JSONLinesOutput():
+                dumper.dump()
+        elif options.dump_mode == 'flat':
+            dumper.dump()
+        elif options.dump_mode == 'xml':
+            dumper.dumpXML()
+        elif options.dump_mode == 'canonical-xml' or options.dump_mode == 'cxml':
+            dumper.dumpCanonicalXML()
+        else:
+            error("unknown dump mode: '%s'\n"%options.dump_mode)
+            parser.print_help()
+            sys.exit(1)
+
 
 if __name__ == '__main__':
-    main()
+    with globals.OutputSink():
+        main()
 
 # vim:set filetype=python shiftwidth=4 softtabstop=4 expandtab: